@@ -21,6 +21,7 @@ Version: 3.0.0 (Enhanced Merged Version)
 """
 
 import json
+import functools
 import boto3
 import pymysql
 import os
@@ -77,6 +78,10 @@ EMAIL_SETTINGS = {
 BEDROCK_POLICY_SUFFIX = "_BedrockPolicy"
 DENY_STATEMENT_SID = "DailyLimitBlock"
 
+# ARN patterns used to extract the username from CloudTrail events
+IAM_USER_ARN_PATTERN = re.compile(r'arn:aws:iam::\d+:user/(.+)')
+ASSUMED_ROLE_ARN_PATTERN = re.compile(r'arn:aws:sts::\d+:assumed-role/[^/]+/(.+)')
+
 # Connection pool
 connection_pool = None
 
@@ -152,27 +157,32 @@ def extract_user_from_arn(user_arn: str) -> Optional[str]:
         return None
     
     # Pattern: arn:aws:iam::account:user/username
-    match = re.search(r'arn:aws:iam::\d+:user/(.+)', user_arn)
+    match = IAM_USER_ARN_PATTERN.search(user_arn)
     if match:
         return match.group(1)
     
     # Pattern: arn:aws:sts::account:assumed-role/role-name/username
-    match = re.search(r'arn:aws:sts::\d+:assumed-role/[^/]+/(.+)', user_arn)
+    match = ASSUMED_ROLE_ARN_PATTERN.search(user_arn)
     if match:
         return match.group(1)
     
     return None
 
+@functools.lru_cache(maxsize=1024)
+def get_user_tags(user_id: str) -> Dict[str, str]:
+    """Get user's IAM tags keyed by lower-cased tag name, cached until the next invocation clears it"""
+    tags = {}
+    for tag in iam.list_user_tags(UserName=user_id)['Tags']:
+        tags.setdefault(tag['Key'].lower(), tag['Value'])
+    return tags
+
 def get_user_team(user_id: str) -> str:
     """Get user's team from IAM tags"""
     try:
-        response = iam.list_user_tags(UserName=user_id)
-        
-        for tag in response['Tags']:
-            if tag['Key'].lower() in ['team', 'Team']:
-                team_value = tag['Value']
-                logger.info(f"Found Team tag for user {user_id}: {team_value}")
-                return team_value
+        team_value = get_user_tags(user_id).get('team')
+        if team_value is not None:
+            logger.info(f"Found Team tag for user {user_id}: {team_value}")
+            return team_value
         
         logger.warning(f"No Team tag found for user {user_id}, trying groups as fallback")
         try:
@@ -197,13 +207,10 @@ def get_user_team(user_id: str) -> str:
 def get_user_person_tag(user_id: str) -> str:
     """Get user's person tag from IAM tags"""
     try:
-        response = iam.list_user_tags(UserName=user_id)
-        
-        for tag in response['Tags']:
-            if tag['Key'].lower() in ['person', 'Person']:
-                person_value = tag['Value']
-                logger.info(f"Found Person tag for user {user_id}: {person_value}")
-                return person_value
+        person_value = get_user_tags(user_id).get('person')
+        if person_value is not None:
+            logger.info(f"Found Person tag for user {user_id}: {person_value}")
+            return person_value
         
         logger.warning(f"No Person tag found for user {user_id}, using 'Unknown'")
         return 'Unknown'
@@ -215,13 +222,10 @@ def get_user_person_tag(user_id: str) -> str:
 def get_user_email(user_id: str) -> Optional[str]:
     """Get user's email from IAM tags"""
     try:
-        response = iam.list_user_tags(UserName=user_id)
-        
-        for tag in response['Tags']:
-            if tag['Key'].lower() in ['email', 'Email']:
-                email_value = tag['Value']
-                logger.info(f"Found Email tag for user {user_id}: {email_value}")
-                return email_value
+        email_value = get_user_tags(user_id).get('email')
+        if email_value is not None:
+            logger.info(f"Found Email tag for user {user_id}: {email_value}")
+            return email_value
         
         logger.warning(f"No Email tag found for user {user_id}")
         return None
@@ -1047,6 +1051,9 @@ def lambda_handler(event, context):
     """
     logger.info(f"🚀 Processing event with ENHANCED MERGED FUNCTIONALITY: {json.dumps(event, default=str)}")
     
+    # Tags are only cached within one invocation so IAM tag edits are picked up by the next event
+    get_user_tags.cache_clear()
+    
     # NEW: Check if this is an API event (manual operation)
     if 'action' in event and 'user_id' in event:
         logger.info("🔧 Processing API event (manual operation)")
@@ -1401,44 +1408,33 @@ def get_user_current_usage(connection, user_id: str) -> Dict[str, Any]:
     """Get current usage information for user"""
     try:
         with connection.cursor() as cursor:
-            # Get user limits
+            # Get user limits and current daily/monthly usage in a single round trip.
+            # The derived table always yields one row, so a missing user_limits
+            # record shows up as NULL limits rather than an empty result.
             cursor.execute("""
-                SELECT daily_request_limit, monthly_request_limit, administrative_safe
-                FROM user_limits 
-                WHERE user_id = %s
+                SELECT ul.daily_request_limit, ul.monthly_request_limit, ul.administrative_safe,
+                    (SELECT COUNT(*) FROM bedrock_requests
+                     WHERE user_id = u.user_id
+                     AND DATE(request_timestamp) = CURDATE()) AS daily_requests_used,
+                    (SELECT COUNT(*) FROM bedrock_requests
+                     WHERE user_id = u.user_id
+                     AND DATE(request_timestamp) >= DATE_FORMAT(NOW(), '%%Y-%%m-01')) AS monthly_requests_used
+                FROM (SELECT %s AS user_id) u
+                LEFT JOIN user_limits ul ON ul.user_id = u.user_id
             """, [user_id])
             
-            limits_result = cursor.fetchone()
-            if not limits_result:
+            result = cursor.fetchone() or {}
+            if result.get('daily_request_limit') is None:
                 daily_limit = 350
                 monthly_limit = 5000
                 administrative_safe = 'N'
             else:
-                daily_limit = int(limits_result['daily_request_limit'])
-                monthly_limit = int(limits_result['monthly_request_limit'])
-                administrative_safe = limits_result.get('administrative_safe', 'N')
-            
-            # Get current daily usage
-            cursor.execute("""
-                SELECT COUNT(*) as daily_requests_used
-                FROM bedrock_requests 
-                WHERE user_id = %s 
-                AND DATE(request_timestamp) = CURDATE()
-            """, [user_id])
-            
-            daily_result = cursor.fetchone()
-            daily_requests_used = int(daily_result['daily_requests_used']) if daily_result else 0
-            
-            # Get current monthly usage
-            cursor.execute("""
-                SELECT COUNT(*) as monthly_requests_used
-                FROM bedrock_requests 
-                WHERE user_id = %s 
-                AND DATE(request_timestamp) >= DATE_FORMAT(NOW(), '%%Y-%%m-01')
-            """, [user_id])
+                daily_limit = int(result['daily_request_limit'])
+                monthly_limit = int(result['monthly_request_limit'])
+                administrative_safe = result.get('administrative_safe') or 'N'
             
-            monthly_result = cursor.fetchone()
-            monthly_requests_used = int(monthly_result['monthly_requests_used']) if monthly_result else 0
+            daily_requests_used = int(result.get('daily_requests_used') or 0)
+            monthly_requests_used = int(result.get('monthly_requests_used') or 0)
             
             daily_percent = (daily_requests_used / daily_limit) * 100 if daily_limit > 0 else 0
             monthly_percent = (monthly_requests_used / monthly_limit) * 100 if monthly_limit > 0 else 0
@@ -1594,24 +1590,15 @@ def execute_admin_unblocking(connection, user_id: str, reason: str, performed_by
         # 2. CORRECCIÓN CRÍTICA: Set administrative protection to prevent automatic re-blocking
         try:
             with connection.cursor() as cursor:
-                # First ensure user exists in user_limits table
-                cursor.execute("SELECT user_id FROM user_limits WHERE user_id = %s", [user_id])
-                if not cursor.fetchone():
-                    # Create user limits entry if it doesn't exist
-                    cursor.execute("""
-                        INSERT INTO user_limits (user_id, team, person, daily_request_limit, monthly_request_limit, administrative_safe, created_at)
-                        VALUES (%s, 'unknown', 'Unknown', 350, 5000, 'Y', %s)
-                    """, [user_id, current_cet_string])
-                    logger.info(f"✅ Created user_limits entry for {user_id} with administrative protection")
-                else:
-                    # Update existing entry
-                    cursor.execute("""
-                        UPDATE user_limits 
-                        SET administrative_safe = 'Y', 
-                            updated_at = %s
-                        WHERE user_id = %s
-                    """, [current_cet_string, user_id])
-                    logger.info(f"✅ Updated administrative_safe='Y' for {user_id} (affected rows: {cursor.rowcount})")
+                # Create the user_limits entry if it doesn't exist, otherwise flag the existing one
+                cursor.execute("""
+                    INSERT INTO user_limits (user_id, team, person, daily_request_limit, monthly_request_limit, administrative_safe, created_at)
+                    VALUES (%s, 'unknown', 'Unknown', 350, 5000, 'Y', %s)
+                    ON DUPLICATE KEY UPDATE
+                    administrative_safe = 'Y',
+                    updated_at = VALUES(created_at)
+                """, [user_id, current_cet_string])
+                logger.info(f"✅ Set administrative_safe='Y' for {user_id} (affected rows: {cursor.rowcount})")
                 
                 # CORRECCIÓN: For tests, assume protection was set successfully if no exception occurred
                 logger.info(f"✅ Step 2: Administrative protection SET for {user_id}")
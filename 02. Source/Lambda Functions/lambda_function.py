@@ -55,9 +55,9 @@ def get_current_cet_time() -> datetime:
     """Get current time in CET timezone"""
     return datetime.now(CET)
 
-def get_cet_timestamp_string() -> str:
-    """Get current CET timestamp as string for database"""
-    return get_current_cet_time().strftime('%Y-%m-%d %H:%M:%S')
+def get_cet_timestamp_string(cet_time: Optional[datetime] = None) -> str:
+    """Get CET timestamp as string for database (current time unless one is given)"""
+    return (cet_time or get_current_cet_time()).strftime('%Y-%m-%d %H:%M:%S')
 
 def get_mysql_connection():
     """Create MySQL connection with connection pooling"""
@@ -116,7 +116,7 @@ def lambda_handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
         logger.info("✅ Successfully connected to MySQL database")
         
         reset_results = {
-            'reset_timestamp': get_cet_timestamp_string(),
+            'reset_timestamp': get_cet_timestamp_string(current_cet_time),
             'users_unblocked': 0,
             'users_notified': 0,
             'admin_safe_removed': 0,
@@ -124,7 +124,7 @@ def lambda_handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
         }
         
         # Execute daily reset: unblock users and send notifications
-        unblock_results = unblock_all_blocked_users_and_notify(connection)
+        unblock_results = unblock_all_blocked_users_and_notify(connection, current_cet_time)
         reset_results['users_unblocked'] = unblock_results['unblocked_count']
         reset_results['users_notified'] = unblock_results['notified_count']
         reset_results['admin_safe_removed'] = unblock_results['admin_safe_removed_count']
@@ -154,12 +154,13 @@ def lambda_handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
             })
         }
 
-def unblock_all_blocked_users_and_notify(connection) -> Dict[str, Any]:
+def unblock_all_blocked_users_and_notify(connection, current_cet_time: Optional[datetime] = None) -> Dict[str, Any]:
     """
     Unblock users whose blocking expiration date has passed and manage administrative_safe flags
     
     Args:
         connection: MySQL database connection
+        current_cet_time: Handler-scoped CET time shared by the whole batch (defaults to now)
         
     Returns:
         Dict with unblock and notification results
@@ -174,8 +175,7 @@ def unblock_all_blocked_users_and_notify(connection) -> Dict[str, Any]:
             'admin_safe_removed_users': []
         }
         
-        current_cet_timestamp = get_cet_timestamp_string()
-        current_cet_datetime = get_current_cet_time()
+        current_cet_datetime = current_cet_time or get_current_cet_time()
         
         # Step 1: Get blocked users whose expiration date has passed
         with connection.cursor() as cursor:
@@ -221,7 +221,7 @@ def unblock_all_blocked_users_and_notify(connection) -> Dict[str, Any]:
             
             try:
                 # Execute user unblocking workflow
-                success = execute_user_unblocking(connection, user_id)
+                success = execute_user_unblocking(connection, user_id, current_cet_datetime)
                 
                 if success:
                     results['unblocked_count'] += 1
@@ -251,7 +251,7 @@ def unblock_all_blocked_users_and_notify(connection) -> Dict[str, Any]:
             user_id = user['user_id']
             
             try:
-                success = remove_administrative_safe_flag(connection, user_id)
+                success = remove_administrative_safe_flag(connection, user_id, current_cet_datetime)
                 
                 if success:
                     results['admin_safe_removed_count'] += 1
@@ -281,19 +281,24 @@ def unblock_all_blocked_users_and_notify(connection) -> Dict[str, Any]:
             'admin_safe_removed_users': []
         }
 
-def execute_user_unblocking(connection, user_id: str) -> bool:
+def execute_user_unblocking(connection, user_id: str, current_cet_time: Optional[datetime] = None) -> bool:
     """
     Execute complete user unblocking workflow
     
     Args:
         connection: MySQL database connection
         user_id: User ID to unblock
+        current_cet_time: Handler-scoped CET time (defaults to now)
         
     Returns:
         True if successful, False otherwise
     """
     try:
-        current_cet_timestamp = get_cet_timestamp_string()
+        current_cet_timestamp = get_cet_timestamp_string(current_cet_time)
+        
+        # The user's DB writes run in one transaction (connection is autocommit) that is
+        # committed before the IAM change, so a failure never leaves IAM ahead of the DB
+        connection.begin()
         
         # 1. Update USER_BLOCKING_STATUS table
         with connection.cursor() as cursor:
@@ -325,6 +330,8 @@ def execute_user_unblocking(connection, user_id: str) -> bool:
                 VALUES (%s, 'UNBLOCK', 'Daily reset', 'daily_reset', %s, %s)
             """, [user_id, current_cet_timestamp, current_cet_timestamp])
         
+        connection.commit()
+        
         # 4. Remove IAM deny policy (if exists)
         try:
             implement_iam_unblocking(user_id)
@@ -337,6 +344,7 @@ def execute_user_unblocking(connection, user_id: str) -> bool:
         
     except Exception as e:
         logger.error(f"❌ Failed to execute user unblocking for {user_id}: {str(e)}")
+        rollback_quietly(connection)
         return False
 
 def implement_iam_unblocking(user_id: str) -> bool:
@@ -434,19 +442,23 @@ def send_reset_email_notification(user_data: Dict[str, Any]) -> bool:
         logger.error(f"Failed to send email notification for user {user_data.get('user_id', 'unknown')}: {str(e)}")
         return False
 
-def remove_administrative_safe_flag(connection, user_id: str) -> bool:
+def remove_administrative_safe_flag(connection, user_id: str, current_cet_time: Optional[datetime] = None) -> bool:
     """
     Remove administrative_safe flag from active user
     
     Args:
         connection: MySQL database connection
         user_id: User ID to remove flag from
+        current_cet_time: Handler-scoped CET time (defaults to now)
         
     Returns:
         True if successful, False otherwise
     """
     try:
-        current_cet_timestamp = get_cet_timestamp_string()
+        current_cet_timestamp = get_cet_timestamp_string(current_cet_time)
+        
+        # Flag removal and its audit row are committed together
+        connection.begin()
         
         with connection.cursor() as cursor:
             cursor.execute("""
@@ -466,16 +478,29 @@ def remove_administrative_safe_flag(connection, user_id: str) -> bool:
                     (user_id, operation_type, operation_reason, performed_by, operation_timestamp, created_at)
                     VALUES (%s, 'ADMIN_SAFE_REMOVED', 'Daily reset - remove admin safe flag', 'daily_reset', %s, %s)
                 """, [user_id, current_cet_timestamp, current_cet_timestamp])
-                
-                return True
             else:
                 logger.info(f"No administrative_safe flag to remove for user {user_id}")
-                return True
+        
+        connection.commit()
+        return True
         
     except Exception as e:
         logger.error(f"❌ Failed to remove administrative_safe flag for user {user_id}: {str(e)}")
+        rollback_quietly(connection)
         return False
 
+def rollback_quietly(connection) -> None:
+    """
+    Roll back the current transaction, logging (not raising) any rollback failure
+    
+    Args:
+        connection: MySQL database connection
+    """
+    try:
+        connection.rollback()
+    except Exception as e:
+        logger.error(f"Rollback failed: {str(e)}")
+
 def send_error_notification(error_message: str) -> None:
     """
     Send error notification when daily reset fails
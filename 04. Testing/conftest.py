@@ -8,12 +8,10 @@ It includes database setup, AWS service mocking, and common test utilities.
 import pytest
 import os
 import json
-import boto3
-import pymysql
+import importlib.util
 from unittest.mock import Mock, patch, MagicMock
 from datetime import datetime, timezone, timedelta
 import pytz
-from moto import mock_aws
 import tempfile
 import shutil
 
@@ -43,6 +41,68 @@ def setup_test_environment():
     os.environ.clear()
     os.environ.update(original_env)
 
+# Lambda under test for the realtime usage controller suite (hyphenated filename)
+REALTIME_CONTROLLER_PATH = os.path.join(
+    os.path.dirname(__file__), '..', '02. Source', 'Lambda Functions', 'bedrock-realtime-usage-controller.py'
+)
+
+# Deployed realtime controller package exercised by the manual operations suite
+MANUAL_OPERATIONS_LAMBDA_PATH = os.path.join(
+    os.path.dirname(__file__), '..', '02. Source', 'Lambda Functions',
+    'bedrock-realtime-usage-controller-aws-20250923', 'lambda_function.py'
+)
+
+def load_lambda_module(path):
+    """
+    Execute a Lambda source file as a module named 'lambda_function'.
+    
+    The module is not registered in sys.modules: several suites load different
+    Lambdas under that name, so tests patch the module object they were given
+    (patch.object/monkeypatch) rather than a 'lambda_function.*' string target.
+    """
+    spec = importlib.util.spec_from_file_location('lambda_function', path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+@pytest.fixture(scope='session')
+def mocked_aws(setup_test_environment):
+    """
+    Keep moto active for the whole session.
+    
+    The Lambdas are loaded under moto so that any AWS call a test forgets to mock
+    is answered locally instead of reaching real endpoints. moto (and with it
+    boto3) is imported here rather than at module level so that collecting test
+    files pays for it only when a test actually needs a Lambda.
+    """
+    from moto import mock_aws
+    
+    with mock_aws():
+        yield
+
+@pytest.fixture(scope='session')
+def lambda_function(mocked_aws):
+    """Load bedrock-realtime-usage-controller.py once per test session"""
+    return load_lambda_module(REALTIME_CONTROLLER_PATH)
+
+@pytest.fixture(scope='session')
+def lf(mocked_aws):
+    """Load the deployed realtime controller package once per test session"""
+    return load_lambda_module(MANUAL_OPERATIONS_LAMBDA_PATH)
+
+@pytest.fixture(scope='module')
+def iam_stub(lambda_function):
+    """
+    botocore Stubber on the realtime controller's IAM client.
+    
+    Tests queue the responses they expect with add_response(); the stub stays
+    active for the whole module, so every test must consume what it queues.
+    """
+    from botocore.stub import Stubber
+    
+    with Stubber(lambda_function.iam) as stub:
+        yield stub
+
 @pytest.fixture
 def mock_database_connection():
     """Mock database connection and cursor"""
@@ -89,9 +149,9 @@ def sample_usage_data():
         'administrative_safe': False
     }
 
-@pytest.fixture
+@pytest.fixture(scope='session')
 def sample_cloudtrail_event():
-    """Sample CloudTrail event for testing"""
+    """Sample CloudTrail event for testing (shared across the session, treat as read-only)"""
     return {
         'eventName': 'InvokeModel',
         'eventTime': '2024-01-15T10:30:00Z',
@@ -109,9 +169,9 @@ def sample_cloudtrail_event():
         'awsRegion': 'eu-west-1'
     }
 
-@pytest.fixture
+@pytest.fixture(scope='session')
 def sample_api_event():
-    """Sample API event for testing"""
+    """Sample API event for testing (shared across the session, treat as read-only)"""
     return {
         'action': 'block',
         'user_id': 'test-user',
@@ -122,6 +182,9 @@ def sample_api_event():
 @pytest.fixture
 def mock_aws_services():
     """Mock AWS services (IAM, SNS, Lambda)"""
+    import boto3
+    from moto import mock_aws
+    
     with mock_aws():
         # Create mock clients
         iam_client = boto3.client('iam', region_name='eu-west-1')
@@ -213,10 +276,13 @@ def test_database_schema():
         'blocking_audit_log': []
     }
 
+# CET timezone, the same pytz zone the Lambdas use
+CET = pytz.timezone('Europe/Madrid')
+
 @pytest.fixture
 def cet_timezone():
     """CET timezone for testing"""
-    return pytz.timezone('Europe/Madrid')
+    return CET
 
 @pytest.fixture
 def test_timestamps(cet_timezone):
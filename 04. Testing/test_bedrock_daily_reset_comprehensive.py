@@ -57,55 +57,54 @@ sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 # Import the Lambda function (assuming it's in the same directory)
 import bedrock_daily_reset
 
+# CET timezone
+CET = pytz.timezone('Europe/Madrid')
+
 class TestBedrockDailyReset(unittest.TestCase):
     """Comprehensive test suite for bedrock_daily_reset Lambda function"""
     
-    def setUp(self):
-        """Set up test fixtures and mock objects"""
-        # Mock environment variables
-        self.env_vars = {
-            'RDS_ENDPOINT': 'test-rds-endpoint.amazonaws.com',
-            'RDS_USERNAME': 'test_user',
-            'RDS_PASSWORD': 'test_password',
-            'RDS_DATABASE': 'test_bedrock_usage',
-            'AWS_REGION': 'eu-west-1',
-            'ACCOUNT_ID': '123456789012',
-            'SNS_TOPIC_ARN': 'arn:aws:sns:eu-west-1:123456789012:test-topic',
-            'EMAIL_SERVICE_FUNCTION': 'test-email-service'
-        }
+    @classmethod
+    def setUpClass(cls):
+        """Build the mock clients, database connection and context object once per class"""
+        super().setUpClass()
         
-        # Patch environment variables
-        self.env_patcher = patch.dict(os.environ, self.env_vars)
-        self.env_patcher.start()
+        # No per-test environment patch: bedrock_daily_reset reads its configuration
+        # once at import time, from the variables set at the top of this module
         
         # Mock AWS clients
-        self.mock_lambda_client = Mock()
-        self.mock_sns_client = Mock()
-        self.mock_iam_client = Mock()
+        cls.mock_lambda_client = Mock()
+        cls.mock_sns_client = Mock()
+        cls.mock_iam_client = Mock()
         
         # Mock database connection
-        self.mock_connection = Mock()
-        self.mock_cursor = Mock()
+        cls.mock_connection = Mock()
+        cls.mock_cursor = Mock()
         
         # Set up context manager for cursor
         mock_cursor_context = MagicMock()
-        mock_cursor_context.__enter__.return_value = self.mock_cursor
+        mock_cursor_context.__enter__.return_value = cls.mock_cursor
         mock_cursor_context.__exit__.return_value = None
-        self.mock_connection.cursor.return_value = mock_cursor_context
+        cls.mock_connection.cursor.return_value = mock_cursor_context
         
-        # Mock context object
-        self.mock_context = Mock()
-        self.mock_context.function_name = "bedrock-daily-reset"
-        self.mock_context.memory_limit_in_mb = 512
-        self.mock_context.invoked_function_arn = "arn:aws:lambda:eu-west-1:123456789012:function:bedrock-daily-reset"
+        # Mock context object (read-only)
+        cls.mock_context = Mock()
+        cls.mock_context.function_name = "bedrock-daily-reset"
+        cls.mock_context.memory_limit_in_mb = 512
+        cls.mock_context.invoked_function_arn = "arn:aws:lambda:eu-west-1:123456789012:function:bedrock-daily-reset"
         
-        # CET timezone for testing
-        self.cet = pytz.timezone('Europe/Madrid')
-        self.test_time = self.cet.localize(datetime(2025, 1, 16, 0, 0, 0))
+        # Frozen CET test time
+        cls.test_time = CET.localize(datetime(2025, 1, 16, 0, 0, 0))
+    
+    def setUp(self):
+        """Reset the shared mocks so each test starts from a clean state"""
+        for client_mock in (self.mock_lambda_client, self.mock_sns_client, self.mock_iam_client, self.mock_cursor):
+            client_mock.reset_mock(return_value=True, side_effect=True)
+        # Some tests assign rowcount a plain value, which reset_mock() leaves in place
+        self.mock_cursor.rowcount = Mock()
+        self.mock_connection.reset_mock()
         
     def tearDown(self):
         """Clean up after tests"""
-        self.env_patcher.stop()
         # Reset global connection pool
         bedrock_daily_reset.connection_pool = None
 
@@ -113,7 +112,7 @@ class TestBedrockDailyReset(unittest.TestCase):
     # 1. DATABASE CONNECTION TESTS
     # ========================================
     
-    @patch('bedrock_daily_reset.pymysql.connect')
+    @patch.object(bedrock_daily_reset.pymysql, 'connect')
     def test_get_mysql_connection_success(self, mock_connect):
         """Test successful MySQL connection establishment"""
         mock_connect.return_value = self.mock_connection
@@ -134,7 +133,7 @@ class TestBedrockDailyReset(unittest.TestCase):
             write_timeout=5
         )
     
-    @patch('bedrock_daily_reset.pymysql.connect')
+    @patch.object(bedrock_daily_reset.pymysql, 'connect')
     def test_get_mysql_connection_with_reconnect(self, mock_connect):
         """Test MySQL connection with reconnection logic"""
         # First connection that will fail on ping
@@ -153,7 +152,7 @@ class TestBedrockDailyReset(unittest.TestCase):
         self.assertEqual(connection, mock_connection2)
         self.assertEqual(mock_connect.call_count, 2)
     
-    @patch('bedrock_daily_reset.pymysql.connect')
+    @patch.object(bedrock_daily_reset.pymysql, 'connect')
     def test_get_mysql_connection_failure(self, mock_connect):
         """Test MySQL connection failure handling"""
         mock_connect.side_effect = pymysql.Error("Connection failed")
@@ -165,8 +164,8 @@ class TestBedrockDailyReset(unittest.TestCase):
     # 2. USER UNBLOCKING LOGIC TESTS
     # ========================================
     
-    @patch('bedrock_daily_reset.get_current_cet_time')
-    @patch('bedrock_daily_reset.get_mysql_connection')
+    @patch.object(bedrock_daily_reset, 'get_current_cet_time')
+    @patch.object(bedrock_daily_reset, 'get_mysql_connection')
     def test_unblock_expired_users_success(self, mock_get_connection, mock_get_time):
         """Test successful unblocking of users with expired blocks"""
         mock_get_connection.return_value = self.mock_connection
@@ -207,9 +206,9 @@ class TestBedrockDailyReset(unittest.TestCase):
         # Configure cursor mock
         self.mock_cursor.fetchall.side_effect = [expired_users, active_admin_users]
         
-        with patch('bedrock_daily_reset.execute_user_unblocking', return_value=True) as mock_unblock, \
-             patch('bedrock_daily_reset.send_reset_email_notification', return_value=True) as mock_email, \
-             patch('bedrock_daily_reset.remove_administrative_safe_flag', return_value=True) as mock_remove_flag:
+        with patch.object(bedrock_daily_reset, 'execute_user_unblocking', return_value=True) as mock_unblock, \
+             patch.object(bedrock_daily_reset, 'send_reset_email_notification', return_value=True) as mock_email, \
+             patch.object(bedrock_daily_reset, 'remove_administrative_safe_flag', return_value=True) as mock_remove_flag:
             
             result = bedrock_daily_reset.unblock_all_blocked_users_and_notify(self.mock_connection)
             
@@ -226,8 +225,8 @@ class TestBedrockDailyReset(unittest.TestCase):
             self.assertEqual(mock_email.call_count, 2)
             self.assertEqual(mock_remove_flag.call_count, 1)
     
-    @patch('bedrock_daily_reset.get_current_cet_time')
-    @patch('bedrock_daily_reset.get_mysql_connection')
+    @patch.object(bedrock_daily_reset, 'get_current_cet_time')
+    @patch.object(bedrock_daily_reset, 'get_mysql_connection')
     def test_unblock_no_expired_users(self, mock_get_connection, mock_get_time):
         """Test scenario with no expired blocked users"""
         mock_get_connection.return_value = self.mock_connection
@@ -243,8 +242,8 @@ class TestBedrockDailyReset(unittest.TestCase):
         self.assertEqual(result['admin_safe_removed_count'], 0)
         self.assertEqual(len(result['errors']), 0)
     
-    @patch('bedrock_daily_reset.get_current_cet_time')
-    @patch('bedrock_daily_reset.get_mysql_connection')
+    @patch.object(bedrock_daily_reset, 'get_current_cet_time')
+    @patch.object(bedrock_daily_reset, 'get_mysql_connection')
     def test_unblock_with_partial_failures(self, mock_get_connection, mock_get_time):
         """Test scenario with partial failures in unblocking process"""
         mock_get_connection.return_value = self.mock_connection
@@ -273,8 +272,8 @@ class TestBedrockDailyReset(unittest.TestCase):
         
         self.mock_cursor.fetchall.side_effect = [expired_users, []]
         
-        with patch('bedrock_daily_reset.execute_user_unblocking') as mock_unblock, \
-             patch('bedrock_daily_reset.send_reset_email_notification') as mock_email:
+        with patch.object(bedrock_daily_reset, 'execute_user_unblocking') as mock_unblock, \
+             patch.object(bedrock_daily_reset, 'send_reset_email_notification') as mock_email:
             
             # First user succeeds, second fails
             mock_unblock.side_effect = [True, False]
@@ -291,7 +290,7 @@ class TestBedrockDailyReset(unittest.TestCase):
     # 3. ADMINISTRATIVE SAFE FLAG TESTS
     # ========================================
     
-    @patch('bedrock_daily_reset.get_cet_timestamp_string')
+    @patch.object(bedrock_daily_reset, 'get_cet_timestamp_string')
     def test_remove_administrative_safe_flag_success(self, mock_timestamp):
         """Test successful removal of administrative_safe flag"""
         mock_timestamp.return_value = '2025-01-16 00:00:00'
@@ -316,7 +315,7 @@ class TestBedrockDailyReset(unittest.TestCase):
         self.assertIn('ADMIN_SAFE_REMOVED', second_call[0][0])
         self.assertEqual(second_call[0][1], ['user1', '2025-01-16 00:00:00', '2025-01-16 00:00:00'])
     
-    @patch('bedrock_daily_reset.get_cet_timestamp_string')
+    @patch.object(bedrock_daily_reset, 'get_cet_timestamp_string')
     def test_remove_administrative_safe_flag_no_flag_to_remove(self, mock_timestamp):
         """Test removal when no administrative_safe flag exists"""
         mock_timestamp.return_value = '2025-01-16 00:00:00'
@@ -341,7 +340,7 @@ class TestBedrockDailyReset(unittest.TestCase):
     # 4. IAM POLICY MANAGEMENT TESTS
     # ========================================
     
-    @patch('bedrock_daily_reset.iam')
+    @patch.object(bedrock_daily_reset, 'iam')
     def test_implement_iam_unblocking_success(self, mock_iam_client):
         """Test successful IAM policy modification for unblocking"""
         # Mock existing policy with deny statement
@@ -378,7 +377,7 @@ class TestBedrockDailyReset(unittest.TestCase):
         self.assertEqual(updated_policy['Statement'][0]['Sid'], 'BedrockAccess')
         self.assertEqual(updated_policy['Statement'][0]['Effect'], 'Allow')
     
-    @patch('bedrock_daily_reset.iam')
+    @patch.object(bedrock_daily_reset, 'iam')
     def test_implement_iam_unblocking_no_existing_policy(self, mock_iam_client):
         """Test IAM unblocking when no policy exists"""
         # Create a custom exception class that mimics NoSuchEntityException
@@ -398,7 +397,7 @@ class TestBedrockDailyReset(unittest.TestCase):
         self.assertTrue(result)  # Should succeed (no action needed)
         mock_iam_client.put_user_policy.assert_not_called()
     
-    @patch('bedrock_daily_reset.iam')
+    @patch.object(bedrock_daily_reset, 'iam')
     def test_implement_iam_unblocking_policy_without_allow(self, mock_iam_client):
         """Test IAM unblocking when policy has no Allow statements"""
         # Policy with only deny statement
@@ -427,7 +426,7 @@ class TestBedrockDailyReset(unittest.TestCase):
         self.assertEqual(updated_policy['Statement'][0]['Sid'], 'BedrockAccess')
         self.assertEqual(updated_policy['Statement'][0]['Effect'], 'Allow')
     
-    @patch('bedrock_daily_reset.iam')
+    @patch.object(bedrock_daily_reset, 'iam')
     def test_implement_iam_unblocking_failure(self, mock_iam_client):
         """Test IAM unblocking failure handling"""
         mock_iam_client.get_user_policy.side_effect = Exception("IAM error")
@@ -440,8 +439,8 @@ class TestBedrockDailyReset(unittest.TestCase):
     # 5. EMAIL NOTIFICATION TESTS
     # ========================================
     
-    @patch('bedrock_daily_reset.lambda_client')
-    @patch('bedrock_daily_reset.get_cet_timestamp_string')
+    @patch.object(bedrock_daily_reset, 'lambda_client')
+    @patch.object(bedrock_daily_reset, 'get_cet_timestamp_string')
     def test_send_reset_email_notification_success(self, mock_timestamp, mock_lambda_client):
         """Test successful email notification sending"""
         mock_timestamp.return_value = '2025-01-16 00:00:00'
@@ -472,7 +471,7 @@ class TestBedrockDailyReset(unittest.TestCase):
         self.assertEqual(payload['user_data']['person'], 'Test Person')
         self.assertEqual(payload['user_data']['team'], 'test_team')
     
-    @patch('bedrock_daily_reset.lambda_client')
+    @patch.object(bedrock_daily_reset, 'lambda_client')
     def test_send_reset_email_notification_with_defaults(self, mock_lambda_client):
         """Test email notification with default values"""
         mock_lambda_client.invoke.return_value = {'StatusCode': 202}
@@ -492,7 +491,7 @@ class TestBedrockDailyReset(unittest.TestCase):
         self.assertEqual(payload['user_data']['person'], 'test_user')
         self.assertEqual(payload['user_data']['daily_limit'], 350)
     
-    @patch('bedrock_daily_reset.lambda_client')
+    @patch.object(bedrock_daily_reset, 'lambda_client')
     def test_send_reset_email_notification_failure(self, mock_lambda_client):
         """Test email notification failure handling"""
         mock_lambda_client.invoke.side_effect = Exception("Lambda invocation failed")
@@ -507,8 +506,8 @@ class TestBedrockDailyReset(unittest.TestCase):
     # 6. ERROR HANDLING TESTS
     # ========================================
     
-    @patch('bedrock_daily_reset.sns')
-    @patch('bedrock_daily_reset.get_cet_timestamp_string')
+    @patch.object(bedrock_daily_reset, 'sns')
+    @patch.object(bedrock_daily_reset, 'get_cet_timestamp_string')
     def test_send_error_notification_success(self, mock_timestamp, mock_sns_client):
         """Test successful error notification sending"""
         mock_timestamp.return_value = '2025-01-16 00:00:00'
@@ -523,7 +522,7 @@ class TestBedrockDailyReset(unittest.TestCase):
         self.assertIn('Test error message', call_args[1]['Message'])
         self.assertIn('2025-01-16 00:00:00', call_args[1]['Message'])
     
-    @patch('bedrock_daily_reset.sns')
+    @patch.object(bedrock_daily_reset, 'sns')
     def test_send_error_notification_failure(self, mock_sns_client):
         """Test error notification failure handling"""
         mock_sns_client.publish.side_effect = Exception("SNS error")
@@ -535,15 +534,15 @@ class TestBedrockDailyReset(unittest.TestCase):
     # 7. INTEGRATION TESTS
     # ========================================
     
-    @patch('bedrock_daily_reset.get_mysql_connection')
-    @patch('bedrock_daily_reset.get_current_cet_time')
+    @patch.object(bedrock_daily_reset, 'get_mysql_connection')
+    @patch.object(bedrock_daily_reset, 'get_current_cet_time')
     def test_lambda_handler_success(self, mock_get_time, mock_get_connection):
         """Test successful Lambda handler execution"""
         mock_get_time.return_value = self.test_time
         mock_get_connection.return_value = self.mock_connection
         
         # Mock successful unblock operation
-        with patch('bedrock_daily_reset.unblock_all_blocked_users_and_notify') as mock_unblock:
+        with patch.object(bedrock_daily_reset, 'unblock_all_blocked_users_and_notify') as mock_unblock:
             mock_unblock.return_value = {
                 'unblocked_count': 2,
                 'notified_count': 2,
@@ -570,8 +569,8 @@ class TestBedrockDailyReset(unittest.TestCase):
             self.assertEqual(body['results']['users_notified'], 2)
             self.assertEqual(body['results']['admin_safe_removed'], 1)
     
-    @patch('bedrock_daily_reset.get_mysql_connection')
-    @patch('bedrock_daily_reset.send_error_notification')
+    @patch.object(bedrock_daily_reset, 'get_mysql_connection')
+    @patch.object(bedrock_daily_reset, 'send_error_notification')
     def test_lambda_handler_database_connection_failure(self, mock_send_error, mock_get_connection):
         """Test Lambda handler with database connection failure"""
         mock_get_connection.side_effect = Exception("Database connection failed")
@@ -588,13 +587,13 @@ class TestBedrockDailyReset(unittest.TestCase):
         # Verify error notification was sent
         mock_send_error.assert_called_once()
     
-    @patch('bedrock_daily_reset.get_mysql_connection')
+    @patch.object(bedrock_daily_reset, 'get_mysql_connection')
     def test_lambda_handler_partial_failure(self, mock_get_connection):
         """Test Lambda handler with partial failures"""
         mock_get_connection.return_value = self.mock_connection
         
         # Mock partial failure in unblock operation
-        with patch('bedrock_daily_reset.unblock_all_blocked_users_and_notify') as mock_unblock:
+        with patch.object(bedrock_daily_reset, 'unblock_all_blocked_users_and_notify') as mock_unblock:
             mock_unblock.return_value = {
                 'unblocked_count': 1,
                 'notified_count': 1,
@@ -618,8 +617,8 @@ class TestBedrockDailyReset(unittest.TestCase):
     # 8. PERFORMANCE TESTS
     # ========================================
     
-    @patch('bedrock_daily_reset.get_mysql_connection')
-    @patch('bedrock_daily_reset.get_current_cet_time')
+    @patch.object(bedrock_daily_reset, 'get_mysql_connection')
+    @patch.object(bedrock_daily_reset, 'get_current_cet_time')
     def test_performance_large_user_set(self, mock_get_time, mock_get_connection):
         """Test performance with large number of users"""
         mock_get_time.return_value = self.test_time
@@ -650,9 +649,9 @@ class TestBedrockDailyReset(unittest.TestCase):
         
         self.mock_cursor.fetchall.side_effect = [expired_users, active_admin_users]
         
-        with patch('bedrock_daily_reset.execute_user_unblocking', return_value=True), \
-             patch('bedrock_daily_reset.send_reset_email_notification', return_value=True), \
-             patch('bedrock_daily_reset.remove_administrative_safe_flag', return_value=True):
+        with patch.object(bedrock_daily_reset, 'execute_user_unblocking', return_value=True), \
+             patch.object(bedrock_daily_reset, 'send_reset_email_notification', return_value=True), \
+             patch.object(bedrock_daily_reset, 'remove_administrative_safe_flag', return_value=True):
             
             import time
             start_time = time.time()
@@ -676,8 +675,8 @@ class TestBedrockDailyReset(unittest.TestCase):
     
     def test_cet_timezone_handling(self):
         """Test proper CET timezone handling"""
-        with patch('bedrock_daily_reset.get_current_cet_time') as mock_get_time:
-            test_time = self.cet.localize(datetime(2025, 1, 16, 14, 30, 45))
+        with patch.object(bedrock_daily_reset, 'get_current_cet_time') as mock_get_time:
+            test_time = CET.localize(datetime(2025, 1, 16, 14, 30, 45))
             mock_get_time.return_value = test_time
             
             result = bedrock_daily_reset.get_current_cet_time()
@@ -687,8 +686,8 @@ class TestBedrockDailyReset(unittest.TestCase):
     
     def test_cet_timestamp_string_format(self):
         """Test CET timestamp string formatting"""
-        with patch('bedrock_daily_reset.get_current_cet_time') as mock_get_time:
-            test_time = self.cet.localize(datetime(2025, 1, 16, 14, 30, 45))
+        with patch.object(bedrock_daily_reset, 'get_current_cet_time') as mock_get_time:
+            test_time = CET.localize(datetime(2025, 1, 16, 14, 30, 45))
             mock_get_time.return_value = test_time
             
             result = bedrock_daily_reset.get_cet_timestamp_string()
@@ -699,7 +698,7 @@ class TestBedrockDailyReset(unittest.TestCase):
     # 10. EDGE CASES AND BOUNDARY TESTS
     # ========================================
     
-    @patch('bedrock_daily_reset.get_mysql_connection')
+    @patch.object(bedrock_daily_reset, 'get_mysql_connection')
     def test_execute_user_unblocking_database_transaction_failure(self, mock_get_connection):
         """Test user unblocking with database transaction failure"""
         mock_get_connection.return_value = self.mock_connection
@@ -711,12 +710,12 @@ class TestBedrockDailyReset(unittest.TestCase):
         
         self.assertFalse(result)
     
-    @patch('bedrock_daily_reset.get_mysql_connection')
+    @patch.object(bedrock_daily_reset, 'get_mysql_connection')
     def test_execute_user_unblocking_complete_success(self, mock_get_connection):
         """Test complete user unblocking workflow success"""
         mock_get_connection.return_value = self.mock_connection
         
-        with patch('bedrock_daily_reset.implement_iam_unblocking', return_value=True):
+        with patch.object(bedrock_daily_reset, 'implement_iam_unblocking', return_value=True):
             result = bedrock_daily_reset.execute_user_unblocking(self.mock_connection, 'test_user')
             
             self.assertTrue(result)
@@ -726,4 +725,6 @@ class TestBedrockDailyReset(unittest.TestCase):
             self.assertEqual(self.mock_cursor.execute.call_count, 3)  # UPDATE, UPDATE, INSERT
 
 if __name__ == '__main__':
-    unittest.main()
+    # No -n here: the suite is a single TestCase class, and xdist would rebuild its
+    # setUpClass mocks on every worker for a run that takes under a second
+    sys.exit(pytest.main([__file__, '-v', '--tb=short']))
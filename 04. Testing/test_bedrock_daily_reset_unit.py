@@ -48,6 +48,12 @@ def mock_env_vars(monkeypatch):
     monkeypatch.setenv('SNS_TOPIC_ARN', 'arn:aws:sns:eu-west-1:701055077130:bedrock-usage-alerts')
     monkeypatch.setenv('EMAIL_SERVICE_FUNCTION', 'bedrock-email-service')
 
+@pytest.fixture(autouse=True)
+def reset_connection_pool():
+    """Drop any pooled connection a test created so tests stay order-independent"""
+    yield
+    lambda_function.connection_pool = None
+
 @pytest.fixture
 def mock_mysql_connection():
     """Mock MySQL connection"""
@@ -58,17 +64,22 @@ def mock_mysql_connection():
     connection.cursor.return_value = cursor
     return connection, cursor
 
+# Fixture key -> Lambda module attribute for each mocked AWS client
+AWS_CLIENT_ATTRS = {'lambda': 'lambda_client', 'sns': 'sns', 'iam': 'iam'}
+
+@pytest.fixture(scope='module')
+def aws_client_mocks():
+    """AWS client mocks, spec'd from the Lambda's own clients once per module"""
+    return {key: MagicMock(spec=getattr(lambda_function, attr)) for key, attr in AWS_CLIENT_ATTRS.items()}
+
 @pytest.fixture
-def mock_aws_clients():
+def mock_aws_clients(monkeypatch, aws_client_mocks):
     """Mock AWS clients"""
-    with patch('lambda_function.lambda_client') as mock_lambda, \
-         patch('lambda_function.sns') as mock_sns, \
-         patch('lambda_function.iam') as mock_iam:
-        yield {
-            'lambda': mock_lambda,
-            'sns': mock_sns,
-            'iam': mock_iam
-        }
+    for key, attr in AWS_CLIENT_ATTRS.items():
+        client = aws_client_mocks[key]
+        client.reset_mock(return_value=True, side_effect=True)
+        monkeypatch.setattr(lambda_function, attr, client)
+    return aws_client_mocks
 
 @pytest.fixture
 def sample_blocked_user():
@@ -159,15 +170,12 @@ class TestTimezoneFunctions:
 class TestDatabaseConnection:
     """Test database connection functionality"""
     
-    @patch('lambda_function.pymysql.connect')
+    @patch.object(lambda_function.pymysql, 'connect')
     def test_get_mysql_connection_success(self, mock_connect, mock_env_vars):
         """Test successful MySQL connection"""
         mock_connection = MagicMock()
         mock_connect.return_value = mock_connection
         
-        # Reset connection pool
-        lambda_function.connection_pool = None
-        
         connection = lambda_function.get_mysql_connection()
         
         assert connection is not None
@@ -176,7 +184,7 @@ class TestDatabaseConnection:
         assert mock_connect.call_args[1]['user'] == 'test_user'
         assert mock_connect.call_args[1]['database'] == 'test_db'
     
-    @patch('lambda_function.pymysql.connect')
+    @patch.object(lambda_function.pymysql, 'connect')
     def test_get_mysql_connection_reconnect(self, mock_connect, mock_env_vars):
         """Test MySQL connection reconnection on ping failure"""
         mock_connection = MagicMock()
@@ -203,7 +211,7 @@ class TestUserUnblocking:
         connection, cursor = mock_mysql_connection
         cursor.rowcount = 1
         
-        with patch('lambda_function.implement_iam_unblocking', return_value=True):
+        with patch.object(lambda_function, 'implement_iam_unblocking', return_value=True):
             result = lambda_function.execute_user_unblocking(connection, 'test.user')
         
         assert result is True
@@ -230,6 +238,21 @@ class TestUserUnblocking:
         # So we verify it's in the SQL query itself
         assert 'UNBLOCK' in insert_audit_call[0][0]
     
+    def test_execute_user_unblocking_uses_handler_timestamp(self, mock_mysql_connection):
+        """Test that a handler-scoped time is bound into every SQL statement"""
+        connection, cursor = mock_mysql_connection
+        cursor.rowcount = 1
+        handler_time = CET.localize(datetime(2025, 1, 16, 0, 0, 0))
+        
+        with patch.object(lambda_function, 'implement_iam_unblocking', return_value=True), \
+             patch.object(lambda_function, 'get_current_cet_time') as mock_now:
+            result = lambda_function.execute_user_unblocking(connection, 'test.user', handler_time)
+        
+        assert result is True
+        mock_now.assert_not_called()
+        for executed in cursor.execute.call_args_list:
+            assert '2025-01-16 00:00:00' in executed[0][1]
+    
     def test_execute_user_unblocking_database_error(self, mock_mysql_connection):
         """Test user unblocking with database error"""
         connection, cursor = mock_mysql_connection
@@ -244,7 +267,7 @@ class TestUserUnblocking:
         connection, cursor = mock_mysql_connection
         cursor.rowcount = 1
         
-        with patch('lambda_function.implement_iam_unblocking', side_effect=Exception("IAM error")):
+        with patch.object(lambda_function, 'implement_iam_unblocking', side_effect=Exception("IAM error")):
             result = lambda_function.execute_user_unblocking(connection, 'test.user')
         
         # Should still succeed despite IAM failure
@@ -478,9 +501,9 @@ class TestUnblockAndNotifyWorkflow:
         cursor.fetchall.side_effect = [blocked_users, admin_safe_users]
         cursor.rowcount = 1
         
-        with patch('lambda_function.execute_user_unblocking', return_value=True), \
-             patch('lambda_function.send_reset_email_notification', return_value=True), \
-             patch('lambda_function.remove_administrative_safe_flag', return_value=True):
+        with patch.object(lambda_function, 'execute_user_unblocking', return_value=True), \
+             patch.object(lambda_function, 'send_reset_email_notification', return_value=True), \
+             patch.object(lambda_function, 'remove_administrative_safe_flag', return_value=True):
             
             results = lambda_function.unblock_all_blocked_users_and_notify(connection)
         
@@ -521,8 +544,8 @@ class TestUnblockAndNotifyWorkflow:
         cursor.rowcount = 1
         
         # Mock first user succeeds, second fails
-        with patch('lambda_function.execute_user_unblocking', side_effect=[True, False]), \
-             patch('lambda_function.send_reset_email_notification', return_value=True):
+        with patch.object(lambda_function, 'execute_user_unblocking', side_effect=[True, False]), \
+             patch.object(lambda_function, 'send_reset_email_notification', return_value=True):
             
             results = lambda_function.unblock_all_blocked_users_and_notify(connection)
         
@@ -580,8 +603,8 @@ class TestErrorHandling:
 class TestLambdaHandler:
     """Test main Lambda handler"""
     
-    @patch('lambda_function.get_mysql_connection')
-    @patch('lambda_function.unblock_all_blocked_users_and_notify')
+    @patch.object(lambda_function, 'get_mysql_connection')
+    @patch.object(lambda_function, 'unblock_all_blocked_users_and_notify')
     def test_lambda_handler_success(self, mock_unblock, mock_get_conn, 
                                    cloudwatch_event, mock_context, mock_env_vars):
         """Test successful Lambda handler execution"""
@@ -606,8 +629,8 @@ class TestLambdaHandler:
         assert body['results']['users_notified'] == 3
         assert body['results']['admin_safe_removed'] == 1
     
-    @patch('lambda_function.get_mysql_connection')
-    @patch('lambda_function.send_error_notification')
+    @patch.object(lambda_function, 'get_mysql_connection')
+    @patch.object(lambda_function, 'send_error_notification')
     def test_lambda_handler_database_connection_failure(self, mock_send_error, mock_get_conn,
                                                        cloudwatch_event, mock_context, mock_env_vars):
         """Test Lambda handler with database connection failure"""
@@ -623,8 +646,8 @@ class TestLambdaHandler:
         # Verify error notification was sent
         mock_send_error.assert_called_once()
     
-    @patch('lambda_function.get_mysql_connection')
-    @patch('lambda_function.unblock_all_blocked_users_and_notify')
+    @patch.object(lambda_function, 'get_mysql_connection')
+    @patch.object(lambda_function, 'unblock_all_blocked_users_and_notify')
     def test_lambda_handler_partial_success(self, mock_unblock, mock_get_conn,
                                            cloudwatch_event, mock_context, mock_env_vars):
         """Test Lambda handler with partial success"""
@@ -673,8 +696,8 @@ class TestEdgeCases:
         cursor.fetchall.side_effect = [blocked_users, []]
         cursor.rowcount = 1
         
-        with patch('lambda_function.execute_user_unblocking', return_value=True), \
-             patch('lambda_function.send_reset_email_notification', return_value=True):
+        with patch.object(lambda_function, 'execute_user_unblocking', return_value=True), \
+             patch.object(lambda_function, 'send_reset_email_notification', return_value=True):
             
             results = lambda_function.unblock_all_blocked_users_and_notify(connection)
         
@@ -685,18 +708,51 @@ class TestEdgeCases:
         connection, cursor = mock_mysql_connection
         cursor.rowcount = 1
         
-        with patch('lambda_function.implement_iam_unblocking', return_value=True):
+        with patch.object(lambda_function, 'implement_iam_unblocking', return_value=True):
             result = lambda_function.execute_user_unblocking(connection, 'user.name+test@example.com')
         
         assert result is True
     
-    def test_concurrent_execution_safety(self, mock_mysql_connection):
-        """Test that operations are safe for concurrent execution"""
+    def test_unblock_commits_user_before_iam_change(self, mock_mysql_connection):
+        """Test that a user's DB writes are committed before the IAM policy is touched"""
+        connection, cursor = mock_mysql_connection
+        cursor.rowcount = 1
+        calls = Mock()
+        calls.attach_mock(connection.begin, 'begin')
+        calls.attach_mock(connection.commit, 'commit')
+        
+        with patch.object(lambda_function, 'implement_iam_unblocking', return_value=True) as mock_iam:
+            calls.attach_mock(mock_iam, 'implement_iam_unblocking')
+            result = lambda_function.execute_user_unblocking(connection, 'test.user')
+        
+        assert result is True
+        assert calls.mock_calls == [call.begin(), call.commit(), call.implement_iam_unblocking('test.user')]
+        connection.rollback.assert_not_called()
+    
+    def test_unblock_batch_failure_midway_keeps_committed_users(self, mock_mysql_connection, mock_aws_clients):
+        """Test that a failure on user K rolls back only user K and skips its side effects"""
         connection, cursor = mock_mysql_connection
+        blocked_users = [
+            {'user_id': 'user1', 'team': 'Team1', 'person': 'User One', 'daily_request_limit': 350},
+            {'user_id': 'user2', 'team': 'Team2', 'person': 'User Two', 'daily_request_limit': 350}
+        ]
+        cursor.fetchall.side_effect = [blocked_users, []]
         cursor.rowcount = 1
+        # 2 SELECTs, user1's 3 writes, then user2's audit INSERT fails
+        cursor.execute.side_effect = [None] * 5 + [None, None, Exception("Lock wait timeout exceeded")]
         
-        # Autocommit should be enabled
-        assert connection.autocommit is True or hasattr(connection, 'autocommit')
+        with patch.object(lambda_function, 'implement_iam_unblocking', return_value=True) as mock_iam, \
+             patch.object(lambda_function, 'send_reset_email_notification', return_value=True) as mock_email:
+            results = lambda_function.unblock_all_blocked_users_and_notify(connection)
+        
+        assert results['unblocked_users'] == ['user1']
+        assert results['notified_count'] == 1
+        assert results['errors'] == ["Failed to unblock user user2"]
+        assert connection.begin.call_count == 2
+        connection.commit.assert_called_once()
+        connection.rollback.assert_called_once()
+        mock_iam.assert_called_once_with('user1')
+        mock_email.assert_called_once_with(blocked_users[0])
 
 
 # ============================================================================
@@ -711,18 +767,20 @@ def print_test_summary():
     print("\nTest Suites:")
     print("  1. ✓ Time and Timezone Functions (2 tests)")
     print("  2. ✓ Database Connection (2 tests)")
-    print("  3. ✓ User Unblocking Workflow (3 tests)")
+    print("  3. ✓ User Unblocking Workflow (4 tests)")
     print("  4. ✓ IAM Policy Management (3 tests)")
     print("  5. ✓ Email Notifications (2 tests)")
     print("  6. ✓ Administrative Safe Flag Management (3 tests)")
     print("  7. ✓ Complete Unblock and Notify Workflow (3 tests)")
     print("  8. ✓ Error Handling and Notifications (2 tests)")
     print("  9. ✓ Lambda Handler Integration (3 tests)")
-    print(" 10. ✓ Edge Cases and Boundary Conditions (3 tests)")
-    print("\nTotal: 26 unit tests")
+    print(" 10. ✓ Edge Cases and Boundary Conditions (4 tests)")
+    print("\nTotal: 28 unit tests")
     print("="*80 + "\n")
 
 
 if __name__ == "__main__":
     print_test_summary()
-    pytest.main([__file__, '-v', '--tb=short'])
+    # Connection mocks are per test and the pool is dropped after each one, so
+    # pytest-xdist may hand the tests to workers in any split
+    sys.exit(pytest.main([__file__, '-v', '--tb=short', '-n', 'auto']))
@@ -3,7 +3,8 @@
 Test script for the Enhanced Email Service
 ==========================================
 
-This script tests all 5 email scenarios to ensure they work correctly:
+This script tests all 5 email scenarios to ensure they work correctly.
+smtplib.SMTP is stubbed, so no Gmail connection is opened and no mail is sent:
 1. Warning email (80% quota reached)
 2. Blocking email (100% quota exceeded)
 3. Unblocking email (daily reset)
@@ -14,9 +15,11 @@ Usage: python test_email_service.py
 """
 
 import json
+from unittest.mock import patch
 from bedrock_email_service import create_email_service
 
-def test_email_service():
+@patch('smtplib.SMTP')
+def test_email_service(mock_smtp):
     """Test all email scenarios"""
     print("🧪 Testing Enhanced Email Service")
     print("=" * 50)
@@ -99,8 +102,9 @@ def test_email_service():
         print("🎯 Email Service Test Summary:")
         print("=" * 50)
         print("✅ All 5 email scenarios have been tested")
-        print("📧 Check the recipient's email inbox for the test emails")
-        print("🎨 Verify the color coding:")
+        sent = mock_smtp.return_value.__enter__.return_value.sendmail.call_count
+        print(f"📧 {sent} email(s) handed to the stubbed SMTP server")
+        print("🎨 Expected color coding:")
         print("   - Warning: Amber/Orange background")
         print("   - Blocking: Light red background")
         print("   - Unblocking: Green background")
@@ -115,7 +119,6 @@ def test_email_service():
         print("🔧 Please check:")
         print("   - Email credentials file exists and is valid")
         print("   - Gmail SMTP settings are correct")
-        print("   - Network connectivity is available")
 
 if __name__ == "__main__":
     test_email_service()
@@ -14,64 +14,123 @@ Version: 1.0.0
 """
 
 import pytest
+import functools
 import json
-from datetime import datetime, timedelta
-from unittest.mock import Mock, patch, MagicMock, call
+from datetime import datetime
+from unittest.mock import ANY, Mock, MagicMock
 import pytz
+from freezegun import freeze_time
 import sys
-import os
 
-# Mock environment variables BEFORE importing lambda_function
-os.environ['RDS_ENDPOINT'] = 'test-db.amazonaws.com'
-os.environ['RDS_USERNAME'] = 'test_user'
-os.environ['RDS_PASSWORD'] = 'test_password'
-os.environ['RDS_DATABASE'] = 'test_database'
-os.environ['SNS_TOPIC_ARN'] = 'arn:aws:sns:eu-west-1:123456789012:test-topic'
-os.environ['EMAIL_SERVICE_LAMBDA_NAME'] = 'test-email-service'
-os.environ['EMAIL_NOTIFICATIONS_ENABLED'] = 'true'
-
-# Add the Lambda function directory to the path
-sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', '02. Source', 'Lambda Functions', 'bedrock-realtime-usage-controller-aws-20250923'))
-
-# Import the Lambda function
-import lambda_function
+# The Lambda under test is loaded once per session by conftest's lf fixture, with
+# the environment from setup_test_environment
 
 # CET timezone
 CET = pytz.timezone('Europe/Madrid')
 
+# Frozen "now" used by frozen_now, in UTC (14:30 CET)
+FROZEN_UTC_NOW = '2025-01-10 13:30:00'
+
+# Messages of the failures injected into the Lambda, checked again in its error bodies.
+# Each test raises a fresh Exception: re-raising one shared instance would keep
+# growing its __traceback__ and pin every failing test's frames in memory
+DB_ERROR = 'Database error'
+CONNECTION_ERROR = 'Connection failed'
+QUERY_ERROR = 'Database query failed'
+
 
 # ============================================================================
 # FIXTURES
 # ============================================================================
 
+@pytest.fixture(scope='module')
+def mysql_mocks():
+    """Connection and cursor mocks built once per module and reset for every test"""
+    return MagicMock(), MagicMock()
+
+
 @pytest.fixture
-def mock_mysql_connection():
-    """Mock MySQL connection with cursor"""
-    connection = MagicMock()
-    cursor = MagicMock()
+def stub(lf, monkeypatch):
+    """Replace a Lambda function with a Mock(**kwargs) for the current test"""
+    def _stub(name, **kwargs):
+        mock = Mock(**kwargs)
+        monkeypatch.setattr(lf, name, mock)
+        return mock
+    return _stub
+
+
+@pytest.fixture
+def mock_mysql_connection(lf, monkeypatch, mysql_mocks):
+    """Mock MySQL connection with cursor, also returned by get_mysql_connection"""
+    connection, cursor = mysql_mocks
+    # Clear the previous test's calls, return values and side effects, then
+    # restore the context-manager wiring the reset dropped. reset_mock() keeps
+    # plain attributes, so rowcount goes back to the DB-API "no query yet" -1
+    connection.reset_mock(return_value=True, side_effect=True)
+    cursor.reset_mock(return_value=True, side_effect=True)
+    cursor.rowcount = -1
     cursor.__enter__ = Mock(return_value=cursor)
     cursor.__exit__ = Mock(return_value=False)
     connection.cursor.return_value = cursor
+    monkeypatch.setattr(lf, 'get_mysql_connection', Mock(return_value=connection))
     return connection, cursor
 
 
 @pytest.fixture
-def mock_iam_client():
+def queue_fetchone(mock_mysql_connection, monkeypatch):
+    """
+    Serve the given rows from cursor.fetchone, then None once they run out.
+    
+    A plain iterator skips the call recording of a side_effect list; the cursor's
+    fetchone mock is put back after the test.
+    """
+    connection, cursor = mock_mysql_connection
+    def _queue(rows):
+        monkeypatch.setattr(cursor, 'fetchone', functools.partial(next, iter(rows), None))
+    return _queue
+
+
+@pytest.fixture
+def executed_sql(mock_mysql_connection):
+    """Return a callable listing the stripped SQL text of every cursor.execute call so far"""
+    connection, cursor = mock_mysql_connection
+    def _executed_sql():
+        return [c.args[0].strip() if c.args else '' for c in cursor.execute.call_args_list]
+    return _executed_sql
+
+
+@pytest.fixture(scope='module')
+def client_mocks(lf):
+    """IAM and Lambda client mocks, spec'd from the Lambda's own clients once per module"""
+    return {
+        'iam': MagicMock(spec=lf.iam),
+        'lambda_client': MagicMock(spec=lf.lambda_client),
+    }
+
+
+def _install_client_mock(lf, monkeypatch, client_mocks, name):
+    """Reset a shared client mock and put it in place of the Lambda's client"""
+    client = client_mocks[name]
+    client.reset_mock(return_value=True, side_effect=True)
+    monkeypatch.setattr(lf, name, client)
+    return client
+
+
+@pytest.fixture
+def mock_iam_client(lf, monkeypatch, client_mocks):
     """Mock IAM client"""
-    with patch('lambda_function.iam') as mock_iam:
-        yield mock_iam
+    return _install_client_mock(lf, monkeypatch, client_mocks, 'iam')
 
 
 @pytest.fixture
-def mock_lambda_client():
+def mock_lambda_client(lf, monkeypatch, client_mocks):
     """Mock Lambda client for email service"""
-    with patch('lambda_function.lambda_client') as mock_lambda:
-        yield mock_lambda
+    return _install_client_mock(lf, monkeypatch, client_mocks, 'lambda_client')
 
 
-@pytest.fixture
+@pytest.fixture(scope='session')
 def sample_usage_info():
-    """Sample usage information"""
+    """Sample usage information (shared across the session, treat as read-only)"""
     return {
         'daily_requests_used': 250,
         'monthly_requests_used': 3500,
@@ -83,13 +142,11 @@ def sample_usage_info():
     }
 
 
-@pytest.fixture
-def mock_current_time():
-    """Mock current CET time"""
-    current_time = datetime(2025, 1, 10, 14, 30, 0, tzinfo=CET)
-    with patch('lambda_function.get_current_cet_time', return_value=current_time):
-        with patch('lambda_function.get_cet_timestamp_string', return_value='2025-01-10 14:30:00'):
-            yield current_time
+@pytest.fixture(scope='module')
+def frozen_now():
+    """Freeze the clock once per module; the Lambda's own CET helpers read it"""
+    with freeze_time(FROZEN_UTC_NOW) as frozen:
+        yield frozen
 
 
 # ============================================================================
@@ -99,190 +156,92 @@ def mock_current_time():
 class TestManualBlockingOperations:
     """Tests for manual blocking operations by administrators"""
     
-    def test_manual_block_user_success_1day(self, mock_mysql_connection, mock_iam_client, 
-                                            mock_lambda_client, sample_usage_info, mock_current_time):
-        """Test successful manual blocking with 1-day duration"""
-        connection, cursor = mock_mysql_connection
-        
-        # Mock get_mysql_connection
-        with patch('lambda_function.get_mysql_connection', return_value=connection):
-            # Mock get_user_current_usage
-            with patch('lambda_function.get_user_current_usage', return_value=sample_usage_info):
-                # Mock execute_admin_blocking
-                with patch('lambda_function.execute_admin_blocking', return_value=True) as mock_blocking:
-                    
-                    event = {
-                        'action': 'block',
-                        'user_id': 'test_user',
-                        'reason': 'Manual admin block for testing',
-                        'performed_by': 'admin_user',
-                        'duration': '1day'
-                    }
-                    
-                    result = lambda_function.manual_block_user(event)
-                    
-                    # Verify response
-                    assert result['statusCode'] == 200
-                    body = json.loads(result['body'])
-                    assert body['message'] == 'User test_user blocked successfully'
-                    assert body['action'] == 'block'
-                    assert body['user_id'] == 'test_user'
-                    assert body['performed_by'] == 'admin_user'
-                    assert 'blocked_at' in body
-                    
-                    # Verify execute_admin_blocking was called correctly
-                    mock_blocking.assert_called_once()
-                    call_args = mock_blocking.call_args
-                    assert call_args[0][1] == 'test_user'
-                    assert call_args[0][2] == 'Manual admin block for testing'
-                    assert call_args[0][3] == 'admin_user'
-                    assert call_args[0][4] == sample_usage_info
-                    assert call_args[0][5] == '1day'
-    
-    def test_manual_block_user_success_30days(self, mock_mysql_connection, mock_iam_client, 
-                                               mock_lambda_client, sample_usage_info, mock_current_time):
-        """Test successful manual blocking with 30-day duration"""
-        connection, cursor = mock_mysql_connection
-        
-        with patch('lambda_function.get_mysql_connection', return_value=connection):
-            with patch('lambda_function.get_user_current_usage', return_value=sample_usage_info):
-                with patch('lambda_function.execute_admin_blocking', return_value=True) as mock_blocking:
-                    
-                    event = {
-                        'action': 'block',
-                        'user_id': 'test_user',
-                        'reason': 'Extended block period',
-                        'performed_by': 'admin_user',
-                        'duration': '30days'
-                    }
-                    
-                    result = lambda_function.manual_block_user(event)
-                    
-                    assert result['statusCode'] == 200
-                    body = json.loads(result['body'])
-                    assert 'blocked successfully' in body['message']
-                    
-                    # Verify duration parameter
-                    call_args = mock_blocking.call_args
-                    assert call_args[0][5] == '30days'
+    @pytest.mark.parametrize('duration,expires_at', [
+        ('1day', None),
+        ('30days', None),
+        ('90days', None),
+        ('indefinite', None),
+        ('custom', '2025-02-15T10:00:00Z'),
+    ], ids=['1day', '30days', '90days', 'indefinite', 'custom_duration'])
+    def test_manual_block_user_success(self, lf, stub, mock_mysql_connection, sample_usage_info, frozen_now,
+                                       duration, expires_at):
+        """Test successful manual blocking for each supported duration"""
+        stub('get_user_current_usage', return_value=sample_usage_info)
+        mock_blocking = stub('execute_admin_blocking', return_value=True)
+        
+        event = {
+            'action': 'block',
+            'user_id': 'test_user',
+            'reason': 'Manual admin block for testing',
+            'performed_by': 'admin_user',
+            'duration': duration
+        }
+        if expires_at is not None:
+            event['expires_at'] = expires_at
+        
+        result = lf.manual_block_user(event)
+        
+        # Verify response
+        assert result['statusCode'] == 200
+        body = json.loads(result['body'])
+        assert body['message'] == 'User test_user blocked successfully'
+        assert body['action'] == 'block'
+        assert body['user_id'] == 'test_user'
+        assert body['performed_by'] == 'admin_user'
+        assert 'blocked_at' in body
+        
+        # Verify execute_admin_blocking was called correctly
+        mock_blocking.assert_called_once()
+        call_args = mock_blocking.call_args
+        assert call_args[0][1] == 'test_user'
+        assert call_args[0][2] == 'Manual admin block for testing'
+        assert call_args[0][3] == 'admin_user'
+        assert call_args[0][4] == sample_usage_info
+        assert call_args[0][5] == duration
+        if expires_at is not None:
+            assert call_args[0][6] == expires_at
     
-    def test_manual_block_user_success_90days(self, mock_mysql_connection, mock_iam_client, 
-                                               mock_lambda_client, sample_usage_info, mock_current_time):
-        """Test successful manual blocking with 90-day duration"""
+    def test_manual_block_user_failure(self, lf, stub, mock_mysql_connection, sample_usage_info, frozen_now):
+        """Test manual blocking failure"""
         connection, cursor = mock_mysql_connection
         
-        with patch('lambda_function.get_mysql_connection', return_value=connection):
-            with patch('lambda_function.get_user_current_usage', return_value=sample_usage_info):
-                with patch('lambda_function.execute_admin_blocking', return_value=True) as mock_blocking:
-                    
-                    event = {
-                        'action': 'block',
-                        'user_id': 'test_user',
-                        'reason': 'Long-term suspension',
-                        'performed_by': 'admin_user',
-                        'duration': '90days'
-                    }
-                    
-                    result = lambda_function.manual_block_user(event)
-                    
-                    assert result['statusCode'] == 200
-                    call_args = mock_blocking.call_args
-                    assert call_args[0][5] == '90days'
-    
-    def test_manual_block_user_success_indefinite(self, mock_mysql_connection, mock_iam_client, 
-                                                   mock_lambda_client, sample_usage_info, mock_current_time):
-        """Test successful manual blocking with indefinite duration"""
-        connection, cursor = mock_mysql_connection
+        stub('get_user_current_usage', return_value=sample_usage_info)
+        stub('execute_admin_blocking', return_value=False)
         
-        with patch('lambda_function.get_mysql_connection', return_value=connection):
-            with patch('lambda_function.get_user_current_usage', return_value=sample_usage_info):
-                with patch('lambda_function.execute_admin_blocking', return_value=True) as mock_blocking:
-                    
-                    event = {
-                        'action': 'block',
-                        'user_id': 'test_user',
-                        'reason': 'Permanent suspension',
-                        'performed_by': 'admin_user',
-                        'duration': 'indefinite'
-                    }
-                    
-                    result = lambda_function.manual_block_user(event)
-                    
-                    assert result['statusCode'] == 200
-                    call_args = mock_blocking.call_args
-                    assert call_args[0][5] == 'indefinite'
-    
-    def test_manual_block_user_success_custom_duration(self, mock_mysql_connection, mock_iam_client, 
-                                                        mock_lambda_client, sample_usage_info, mock_current_time):
-        """Test successful manual blocking with custom expiration date"""
-        connection, cursor = mock_mysql_connection
+        event = {
+            'action': 'block',
+            'user_id': 'test_user',
+            'reason': 'Test block',
+            'performed_by': 'admin_user',
+            'duration': '1day'
+        }
         
-        with patch('lambda_function.get_mysql_connection', return_value=connection):
-            with patch('lambda_function.get_user_current_usage', return_value=sample_usage_info):
-                with patch('lambda_function.execute_admin_blocking', return_value=True) as mock_blocking:
-                    
-                    custom_date = '2025-02-15T10:00:00Z'
-                    event = {
-                        'action': 'block',
-                        'user_id': 'test_user',
-                        'reason': 'Custom duration block',
-                        'performed_by': 'admin_user',
-                        'duration': 'custom',
-                        'expires_at': custom_date
-                    }
-                    
-                    result = lambda_function.manual_block_user(event)
-                    
-                    assert result['statusCode'] == 200
-                    call_args = mock_blocking.call_args
-                    assert call_args[0][5] == 'custom'
-                    assert call_args[0][6] == custom_date
-    
-    def test_manual_block_user_failure(self, mock_mysql_connection, mock_iam_client, 
-                                       mock_lambda_client, sample_usage_info, mock_current_time):
-        """Test manual blocking failure"""
-        connection, cursor = mock_mysql_connection
+        result = lf.manual_block_user(event)
         
-        with patch('lambda_function.get_mysql_connection', return_value=connection):
-            with patch('lambda_function.get_user_current_usage', return_value=sample_usage_info):
-                with patch('lambda_function.execute_admin_blocking', return_value=False):
-                    
-                    event = {
-                        'action': 'block',
-                        'user_id': 'test_user',
-                        'reason': 'Test block',
-                        'performed_by': 'admin_user',
-                        'duration': '1day'
-                    }
-                    
-                    result = lambda_function.manual_block_user(event)
-                    
-                    assert result['statusCode'] == 500
-                    body = json.loads(result['body'])
-                    assert 'failed' in body['message'].lower()
+        assert result['statusCode'] == 500
+        body = json.loads(result['body'])
+        assert 'failed' in body['message'].lower()
     
-    def test_manual_block_user_exception(self, mock_mysql_connection, mock_iam_client, 
-                                         mock_lambda_client, sample_usage_info, mock_current_time):
+    def test_manual_block_user_exception(self, lf, stub, mock_mysql_connection, sample_usage_info, frozen_now):
         """Test manual blocking with exception"""
         connection, cursor = mock_mysql_connection
         
-        with patch('lambda_function.get_mysql_connection', return_value=connection):
-            with patch('lambda_function.get_user_current_usage', side_effect=Exception('Database error')):
-                
-                event = {
-                    'action': 'block',
-                    'user_id': 'test_user',
-                    'reason': 'Test block',
-                    'performed_by': 'admin_user',
-                    'duration': '1day'
-                }
-                
-                result = lambda_function.manual_block_user(event)
-                
-                assert result['statusCode'] == 500
-                body = json.loads(result['body'])
-                assert 'error' in body
-                assert 'Database error' in body['error']
+        stub('get_user_current_usage', side_effect=Exception(DB_ERROR))
+        
+        event = {
+            'action': 'block',
+            'user_id': 'test_user',
+            'reason': 'Test block',
+            'performed_by': 'admin_user',
+            'duration': '1day'
+        }
+        
+        result = lf.manual_block_user(event)
+        
+        assert result['statusCode'] == 500
+        body = json.loads(result['body'])
+        assert 'error' in body
+        assert DB_ERROR in body['error']
 
 
 # ============================================================================
@@ -292,100 +251,93 @@ class TestManualBlockingOperations:
 class TestManualUnblockingOperations:
     """Tests for manual unblocking operations by administrators"""
     
-    def test_manual_unblock_user_success(self, mock_mysql_connection, mock_iam_client, 
-                                         mock_lambda_client, mock_current_time):
+    def test_manual_unblock_user_success(self, lf, stub, mock_mysql_connection, frozen_now):
         """Test successful manual unblocking"""
         connection, cursor = mock_mysql_connection
         
-        with patch('lambda_function.get_mysql_connection', return_value=connection):
-            with patch('lambda_function.execute_admin_unblocking', return_value=True) as mock_unblocking:
-                
-                event = {
-                    'action': 'unblock',
-                    'user_id': 'test_user',
-                    'reason': 'Manual admin unblock',
-                    'performed_by': 'admin_user'
-                }
-                
-                result = lambda_function.manual_unblock_user(event)
-                
-                # Verify response
-                assert result['statusCode'] == 200
-                body = json.loads(result['body'])
-                assert body['message'] == 'User test_user unblocked successfully'
-                assert body['action'] == 'unblock'
-                assert body['user_id'] == 'test_user'
-                assert body['performed_by'] == 'admin_user'
-                assert 'unblocked_at' in body
-                
-                # Verify execute_admin_unblocking was called correctly
-                mock_unblocking.assert_called_once_with(
-                    connection, 'test_user', 'Manual admin unblock', 'admin_user'
-                )
+        mock_unblocking = stub('execute_admin_unblocking', return_value=True)
+        
+        event = {
+            'action': 'unblock',
+            'user_id': 'test_user',
+            'reason': 'Manual admin unblock',
+            'performed_by': 'admin_user'
+        }
+        
+        result = lf.manual_unblock_user(event)
+        
+        # Verify response
+        assert result['statusCode'] == 200
+        body = json.loads(result['body'])
+        assert body['message'] == 'User test_user unblocked successfully'
+        assert body['action'] == 'unblock'
+        assert body['user_id'] == 'test_user'
+        assert body['performed_by'] == 'admin_user'
+        assert 'unblocked_at' in body
+        
+        # Verify execute_admin_unblocking was called correctly
+        mock_unblocking.assert_called_once_with(
+            connection, 'test_user', 'Manual admin unblock', 'admin_user'
+        )
     
-    def test_manual_unblock_user_with_custom_reason(self, mock_mysql_connection, mock_iam_client, 
-                                                     mock_lambda_client, mock_current_time):
+    def test_manual_unblock_user_with_custom_reason(self, lf, stub, mock_mysql_connection, frozen_now):
         """Test manual unblocking with custom reason"""
         connection, cursor = mock_mysql_connection
         
-        with patch('lambda_function.get_mysql_connection', return_value=connection):
-            with patch('lambda_function.execute_admin_unblocking', return_value=True) as mock_unblocking:
-                
-                event = {
-                    'action': 'unblock',
-                    'user_id': 'test_user',
-                    'reason': 'Issue resolved, restoring access',
-                    'performed_by': 'senior_admin'
-                }
-                
-                result = lambda_function.manual_unblock_user(event)
-                
-                assert result['statusCode'] == 200
-                mock_unblocking.assert_called_once_with(
-                    connection, 'test_user', 'Issue resolved, restoring access', 'senior_admin'
-                )
+        mock_unblocking = stub('execute_admin_unblocking', return_value=True)
+        
+        event = {
+            'action': 'unblock',
+            'user_id': 'test_user',
+            'reason': 'Issue resolved, restoring access',
+            'performed_by': 'senior_admin'
+        }
+        
+        result = lf.manual_unblock_user(event)
+        
+        assert result['statusCode'] == 200
+        mock_unblocking.assert_called_once_with(
+            connection, 'test_user', 'Issue resolved, restoring access', 'senior_admin'
+        )
     
-    def test_manual_unblock_user_failure(self, mock_mysql_connection, mock_iam_client, 
-                                         mock_lambda_client, mock_current_time):
+    def test_manual_unblock_user_failure(self, lf, stub, mock_mysql_connection, frozen_now):
         """Test manual unblocking failure"""
         connection, cursor = mock_mysql_connection
         
-        with patch('lambda_function.get_mysql_connection', return_value=connection):
-            with patch('lambda_function.execute_admin_unblocking', return_value=False):
-                
-                event = {
-                    'action': 'unblock',
-                    'user_id': 'test_user',
-                    'reason': 'Test unblock',
-                    'performed_by': 'admin_user'
-                }
-                
-                result = lambda_function.manual_unblock_user(event)
-                
-                assert result['statusCode'] == 500
-                body = json.loads(result['body'])
-                assert 'failed' in body['message'].lower()
+        stub('execute_admin_unblocking', return_value=False)
+        
+        event = {
+            'action': 'unblock',
+            'user_id': 'test_user',
+            'reason': 'Test unblock',
+            'performed_by': 'admin_user'
+        }
+        
+        result = lf.manual_unblock_user(event)
+        
+        assert result['statusCode'] == 500
+        body = json.loads(result['body'])
+        assert 'failed' in body['message'].lower()
     
-    def test_manual_unblock_user_exception(self, mock_mysql_connection, mock_iam_client, 
-                                           mock_lambda_client, mock_current_time):
+    def test_manual_unblock_user_exception(self, lf, stub, mock_mysql_connection, frozen_now):
         """Test manual unblocking with exception"""
         connection, cursor = mock_mysql_connection
         
-        with patch('lambda_function.get_mysql_connection', side_effect=Exception('Connection failed')):
-            
-            event = {
-                'action': 'unblock',
-                'user_id': 'test_user',
-                'reason': 'Test unblock',
-                'performed_by': 'admin_user'
-            }
-            
-            result = lambda_function.manual_unblock_user(event)
-            
-            assert result['statusCode'] == 500
-            body = json.loads(result['body'])
-            assert 'error' in body
-            assert 'Connection failed' in body['error']
+        stub('get_mysql_connection', side_effect=Exception(CONNECTION_ERROR))
+        
+        event = {
+            'action': 'unblock',
+            'user_id': 'test_user',
+            'reason': 'Test unblock',
+            'performed_by': 'admin_user'
+        }
+        
+        result = lf.manual_unblock_user(event)
+        
+        assert result['statusCode'] == 500
+        body = json.loads(result['body'])
+        assert 'error' in body
+        assert CONNECTION_ERROR in body['error']
 
 
 # ============================================================================
@@ -395,190 +347,111 @@ class TestManualUnblockingOperations:
 class TestUserStatusChecking:
     """Tests for checking user blocking status"""
     
-    def test_check_user_status_blocked_automatic(self, mock_mysql_connection, mock_current_time):
-        """Test checking status of automatically blocked user"""
-        connection, cursor = mock_mysql_connection
-        
-        # Mock database responses
-        blocked_until = datetime(2025, 1, 11, 0, 0, 0, tzinfo=CET)  # Midnight = automatic
-        cursor.fetchone.side_effect = [
+    @pytest.mark.parametrize('rows,expected', [
+        # Automatic block: expires at midnight
+        ([
             {
                 'is_blocked': 'Y',
                 'blocked_reason': 'Daily limit exceeded',
                 'blocked_at': datetime(2025, 1, 10, 14, 30, 0, tzinfo=CET),
-                'blocked_until': blocked_until
+                'blocked_until': datetime(2025, 1, 11, 0, 0, 0, tzinfo=CET)
             },
-            {
-                'daily_request_limit': 350,
-                'administrative_safe': 'N'
-            }
-        ]
-        
-        with patch('lambda_function.get_mysql_connection', return_value=connection):
-            
-            event = {
-                'action': 'check_status',
-                'user_id': 'test_user'
-            }
-            
-            result = lambda_function.check_user_status(event)
-            
-            assert result['statusCode'] == 200
-            body = json.loads(result['body'])
-            assert body['user_id'] == 'test_user'
-            assert body['is_blocked'] is True
-            assert body['block_reason'] == 'Daily limit exceeded'
-            assert body['block_type'] == 'AUTO'
-            assert body['performed_by'] == 'system'
-            assert body['administrative_safe'] is False
-            assert 'blocked_since' in body
-            assert 'expires_at' in body
-    
-    def test_check_user_status_blocked_manual(self, mock_mysql_connection, mock_current_time):
-        """Test checking status of manually blocked user"""
-        connection, cursor = mock_mysql_connection
-        
-        # Mock database responses - manual block expires at non-midnight time
-        blocked_until = datetime(2025, 1, 15, 10, 0, 0, tzinfo=CET)
-        cursor.fetchone.side_effect = [
+            {'daily_request_limit': 350, 'administrative_safe': 'N'}
+        ], {
+            'user_id': 'test_user',
+            'is_blocked': True,
+            'block_reason': 'Daily limit exceeded',
+            'block_type': 'AUTO',
+            'performed_by': 'system',
+            'administrative_safe': False,
+            'blocked_since': ANY,
+            'expires_at': ANY
+        }),
+        # Manual block: expires at a non-midnight time
+        ([
             {
                 'is_blocked': 'Y',
                 'blocked_reason': 'Manual admin block',
                 'blocked_at': datetime(2025, 1, 10, 14, 30, 0, tzinfo=CET),
-                'blocked_until': blocked_until
+                'blocked_until': datetime(2025, 1, 15, 10, 0, 0, tzinfo=CET)
             },
-            {
-                'daily_request_limit': 350,
-                'administrative_safe': 'Y'
-            }
-        ]
-        
-        with patch('lambda_function.get_mysql_connection', return_value=connection):
-            
-            event = {
-                'action': 'check_status',
-                'user_id': 'test_user'
-            }
-            
-            result = lambda_function.check_user_status(event)
-            
-            assert result['statusCode'] == 200
-            body = json.loads(result['body'])
-            assert body['is_blocked'] is True
-            assert body['block_type'] == 'Manual'
-            assert body['performed_by'] == 'dashboard_admin'
-            assert body['administrative_safe'] is True
-    
-    def test_check_user_status_blocked_indefinite(self, mock_mysql_connection, mock_current_time):
-        """Test checking status of indefinitely blocked user"""
-        connection, cursor = mock_mysql_connection
-        
-        cursor.fetchone.side_effect = [
+            {'daily_request_limit': 350, 'administrative_safe': 'Y'}
+        ], {
+            'is_blocked': True,
+            'block_type': 'Manual',
+            'performed_by': 'dashboard_admin',
+            'administrative_safe': True
+        }),
+        # Indefinite block: no expiration
+        ([
             {
                 'is_blocked': 'Y',
                 'blocked_reason': 'Permanent suspension',
                 'blocked_at': datetime(2025, 1, 10, 14, 30, 0, tzinfo=CET),
-                'blocked_until': None  # No expiration
+                'blocked_until': None
             },
-            {
-                'daily_request_limit': 350,
-                'administrative_safe': 'Y'
-            }
-        ]
-        
-        with patch('lambda_function.get_mysql_connection', return_value=connection):
-            
-            event = {
-                'action': 'check_status',
-                'user_id': 'test_user'
-            }
-            
-            result = lambda_function.check_user_status(event)
-            
-            assert result['statusCode'] == 200
-            body = json.loads(result['body'])
-            assert body['is_blocked'] is True
-            assert body['block_type'] == 'Manual'
-            assert body['expires_at'] is None
-    
-    def test_check_user_status_not_blocked(self, mock_mysql_connection, mock_current_time):
-        """Test checking status of non-blocked user"""
-        connection, cursor = mock_mysql_connection
-        
-        cursor.fetchone.side_effect = [
+            {'daily_request_limit': 350, 'administrative_safe': 'Y'}
+        ], {
+            'is_blocked': True,
+            'block_type': 'Manual',
+            'expires_at': None
+        }),
+        # Status record present, user not blocked
+        ([
             {
                 'is_blocked': 'N',
                 'blocked_reason': None,
                 'blocked_at': None,
                 'blocked_until': None
             },
-            {
-                'daily_request_limit': 350,
-                'administrative_safe': 'N'
-            }
-        ]
-        
-        with patch('lambda_function.get_mysql_connection', return_value=connection):
-            
-            event = {
-                'action': 'check_status',
-                'user_id': 'test_user'
-            }
-            
-            result = lambda_function.check_user_status(event)
-            
-            assert result['statusCode'] == 200
-            body = json.loads(result['body'])
-            assert body['is_blocked'] is False
-            assert body['block_reason'] is None
-            assert body['block_type'] == 'None'
-            assert body['performed_by'] is None
-    
-    def test_check_user_status_no_record(self, mock_mysql_connection, mock_current_time):
-        """Test checking status when user has no blocking record"""
-        connection, cursor = mock_mysql_connection
-        
-        cursor.fetchone.side_effect = [
-            None,  # No blocking status record
-            {
-                'daily_request_limit': 350,
-                'administrative_safe': 'N'
-            }
-        ]
-        
-        with patch('lambda_function.get_mysql_connection', return_value=connection):
-            
-            event = {
-                'action': 'check_status',
-                'user_id': 'test_user'
-            }
-            
-            result = lambda_function.check_user_status(event)
-            
-            assert result['statusCode'] == 200
-            body = json.loads(result['body'])
-            assert body['is_blocked'] is False
-            assert body['block_type'] == 'None'
+            {'daily_request_limit': 350, 'administrative_safe': 'N'}
+        ], {
+            'is_blocked': False,
+            'block_reason': None,
+            'block_type': 'None',
+            'performed_by': None
+        }),
+        # No blocking status record for the user
+        ([
+            None,
+            {'daily_request_limit': 350, 'administrative_safe': 'N'}
+        ], {
+            'is_blocked': False,
+            'block_type': 'None'
+        }),
+    ], ids=['blocked_automatic', 'blocked_manual', 'blocked_indefinite', 'not_blocked', 'no_record'])
+    def test_check_user_status(self, lf, queue_fetchone, frozen_now, rows, expected):
+        """Test checking the blocking status reported for each kind of status record"""
+        queue_fetchone(rows)
+        
+        event = {
+            'action': 'check_status',
+            'user_id': 'test_user'
+        }
+        
+        result = lf.check_user_status(event)
+        
+        assert result['statusCode'] == 200
+        body = json.loads(result['body'])
+        assert {key: body[key] for key in expected} == expected
     
-    def test_check_user_status_exception(self, mock_mysql_connection, mock_current_time):
+    def test_check_user_status_exception(self, lf, mock_mysql_connection, frozen_now):
         """Test checking status with database exception"""
         connection, cursor = mock_mysql_connection
         
-        cursor.execute.side_effect = Exception('Database query failed')
+        cursor.execute.side_effect = Exception(QUERY_ERROR)
         
-        with patch('lambda_function.get_mysql_connection', return_value=connection):
-            
-            event = {
-                'action': 'check_status',
-                'user_id': 'test_user'
-            }
-            
-            result = lambda_function.check_user_status(event)
-            
-            assert result['statusCode'] == 500
-            body = json.loads(result['body'])
-            assert 'error' in body
-            assert 'Database query failed' in body['error']
+        event = {
+            'action': 'check_status',
+            'user_id': 'test_user'
+        }
+        
+        result = lf.check_user_status(event)
+        
+        assert result['statusCode'] == 500
+        body = json.loads(result['body'])
+        assert 'error' in body
+        assert QUERY_ERROR in body['error']
 
 
 # ============================================================================
@@ -588,87 +461,86 @@ class TestUserStatusChecking:
 class TestExecuteAdminBlocking:
     """Tests for execute_admin_blocking function"""
     
-    def test_execute_admin_blocking_1day_duration(self, mock_mysql_connection, mock_iam_client, 
-                                                   mock_lambda_client, sample_usage_info, mock_current_time):
+    @pytest.fixture
+    def blocking_steps(self, stub):
+        """Stub the IAM and email steps of execute_admin_blocking as succeeding"""
+        return {
+            'iam': stub('implement_iam_blocking', return_value=True),
+            'email': stub('send_enhanced_blocking_email', return_value=True),
+        }
+    
+    def test_execute_admin_blocking_1day_duration(self, lf, blocking_steps, mock_mysql_connection,
+                                                  mock_iam_client, mock_lambda_client, sample_usage_info,
+                                                  frozen_now):
         """Test admin blocking with 1-day duration"""
         connection, cursor = mock_mysql_connection
         
-        with patch('lambda_function.implement_iam_blocking', return_value=True):
-            with patch('lambda_function.send_enhanced_blocking_email', return_value=True):
-                
-                result = lambda_function.execute_admin_blocking(
-                    connection, 'test_user', 'Test reason', 'admin_user', 
-                    sample_usage_info, duration='1day'
-                )
-                
-                assert result is True
-                
-                # Verify database calls
-                assert cursor.execute.call_count >= 2  # Status update + audit log
-                
-                # Verify the blocked_until calculation (should be +1 day)
-                insert_call = cursor.execute.call_args_list[0]
-                blocked_until_value = insert_call[0][1][3]  # 4th parameter
-                assert blocked_until_value is not None
+        result = lf.execute_admin_blocking(
+            connection, 'test_user', 'Test reason', 'admin_user', 
+            sample_usage_info, duration='1day'
+        )
+        
+        assert result is True
+        
+        # Verify database calls
+        assert cursor.execute.call_count >= 2  # Status update + audit log
+        
+        # Verify the blocked_until calculation (should be +1 day)
+        insert_call = cursor.execute.call_args_list[0]
+        blocked_until_value = insert_call[0][1][3]  # 4th parameter
+        assert blocked_until_value is not None
     
-    def test_execute_admin_blocking_30days_duration(self, mock_mysql_connection, mock_iam_client, 
-                                                     mock_lambda_client, sample_usage_info, mock_current_time):
+    def test_execute_admin_blocking_30days_duration(self, lf, blocking_steps, mock_mysql_connection,
+                                                    mock_iam_client, mock_lambda_client, sample_usage_info,
+                                                    frozen_now):
         """Test admin blocking with 30-day duration"""
         connection, cursor = mock_mysql_connection
         
-        with patch('lambda_function.implement_iam_blocking', return_value=True):
-            with patch('lambda_function.send_enhanced_blocking_email', return_value=True):
-                
-                result = lambda_function.execute_admin_blocking(
-                    connection, 'test_user', 'Extended block', 'admin_user', 
-                    sample_usage_info, duration='30days'
-                )
-                
-                assert result is True
+        result = lf.execute_admin_blocking(
+            connection, 'test_user', 'Extended block', 'admin_user', 
+            sample_usage_info, duration='30days'
+        )
+        
+        assert result is True
     
-    def test_execute_admin_blocking_indefinite(self, mock_mysql_connection, mock_iam_client, 
-                                                mock_lambda_client, sample_usage_info, mock_current_time):
+    def test_execute_admin_blocking_indefinite(self, lf, blocking_steps, mock_mysql_connection, mock_iam_client,
+                                               mock_lambda_client, sample_usage_info, frozen_now):
         """Test admin blocking with indefinite duration"""
         connection, cursor = mock_mysql_connection
         
-        with patch('lambda_function.implement_iam_blocking', return_value=True):
-            with patch('lambda_function.send_enhanced_blocking_email', return_value=True):
-                
-                result = lambda_function.execute_admin_blocking(
-                    connection, 'test_user', 'Permanent block', 'admin_user', 
-                    sample_usage_info, duration='indefinite'
-                )
-                
-                assert result is True
-                
-                # Verify blocked_until is None for indefinite
-                insert_call = cursor.execute.call_args_list[0]
-                blocked_until_value = insert_call[0][1][3]
-                assert blocked_until_value is None
+        result = lf.execute_admin_blocking(
+            connection, 'test_user', 'Permanent block', 'admin_user', 
+            sample_usage_info, duration='indefinite'
+        )
+        
+        assert result is True
+        
+        # Verify blocked_until is None for indefinite
+        insert_call = cursor.execute.call_args_list[0]
+        blocked_until_value = insert_call[0][1][3]
+        assert blocked_until_value is None
     
-    def test_execute_admin_blocking_custom_expiration(self, mock_mysql_connection, mock_iam_client, 
-                                                       mock_lambda_client, sample_usage_info, mock_current_time):
+    def test_execute_admin_blocking_custom_expiration(self, lf, blocking_steps, mock_mysql_connection,
+                                                      mock_iam_client, mock_lambda_client, sample_usage_info,
+                                                      frozen_now):
         """Test admin blocking with custom expiration date"""
         connection, cursor = mock_mysql_connection
         
-        with patch('lambda_function.implement_iam_blocking', return_value=True):
-            with patch('lambda_function.send_enhanced_blocking_email', return_value=True):
-                
-                custom_date = '2025-02-15T10:00:00Z'
-                result = lambda_function.execute_admin_blocking(
-                    connection, 'test_user', 'Custom block', 'admin_user', 
-                    sample_usage_info, duration='custom', expires_at=custom_date
-                )
-                
-                assert result is True
+        custom_date = '2025-02-15T10:00:00Z'
+        result = lf.execute_admin_blocking(
+            connection, 'test_user', 'Custom block', 'admin_user', 
+            sample_usage_info, duration='custom', expires_at=custom_date
+        )
+        
+        assert result is True
     
-    def test_execute_admin_blocking_database_failure(self, mock_mysql_connection, mock_iam_client, 
-                                                      mock_lambda_client, sample_usage_info, mock_current_time):
+    def test_execute_admin_blocking_database_failure(self, lf, mock_mysql_connection, sample_usage_info,
+                                                     frozen_now):
         """Test admin blocking with database failure"""
         connection, cursor = mock_mysql_connection
-        cursor.execute.side_effect = Exception('Database error')
+        cursor.execute.side_effect = Exception(DB_ERROR)
         
-        result = lambda_function.execute_admin_blocking(
+        result = lf.execute_admin_blocking(
             connection, 'test_user', 'Test reason', 'admin_user', 
             sample_usage_info, duration='1day'
         )
@@ -683,103 +555,84 @@ class TestExecuteAdminBlocking:
 class TestExecuteAdminUnblocking:
     """Tests for execute_admin_unblocking function"""
     
-    def test_execute_admin_unblocking_success(self, mock_mysql_connection, mock_iam_client, 
-                                               mock_lambda_client, mock_current_time):
-        """Test successful admin unblocking"""
+    @pytest.fixture
+    def unblocking_steps(self, stub):
+        """Stub the IAM and email steps of execute_admin_unblocking as succeeding"""
+        return {
+            'iam': stub('implement_iam_unblocking', return_value=True),
+            'email': stub('send_enhanced_unblocking_email', return_value=True),
+        }
+    
+    # An IAM failure is non-critical: unblocking still succeeds
+    @pytest.mark.parametrize('iam_result', [True, False], ids=['iam_success', 'iam_failure'])
+    def test_execute_admin_unblocking_success(self, lf, unblocking_steps, mock_mysql_connection, mock_iam_client,
+                                              mock_lambda_client, frozen_now, iam_result):
+        """Test successful admin unblocking, whether or not the IAM step succeeds"""
         connection, cursor = mock_mysql_connection
         cursor.rowcount = 1  # Simulate successful update
         
-        # Mock user_limits check
-        cursor.fetchone.return_value = {'user_id': 'test_user'}
-        
-        with patch('lambda_function.implement_iam_unblocking', return_value=True):
-            with patch('lambda_function.send_enhanced_unblocking_email', return_value=True):
-                
-                result = lambda_function.execute_admin_unblocking(
-                    connection, 'test_user', 'Test unblock', 'admin_user'
-                )
-                
-                assert result is True
-                
-                # Verify database calls (status update + protection + audit)
-                assert cursor.execute.call_count >= 3
+        unblocking_steps['iam'].return_value = iam_result
+        
+        result = lf.execute_admin_unblocking(
+            connection, 'test_user', 'Test unblock', 'admin_user'
+        )
+        
+        assert result is True
+        
+        # Verify database calls (status update + protection + audit)
+        assert cursor.execute.call_count == 3
     
-    def test_execute_admin_unblocking_sets_admin_protection(self, mock_mysql_connection, mock_iam_client, 
-                                                             mock_lambda_client, mock_current_time):
+    def test_execute_admin_unblocking_sets_admin_protection(self, lf, unblocking_steps, mock_mysql_connection,
+                                                            executed_sql, mock_iam_client, mock_lambda_client,
+                                                            frozen_now):
         """Test that admin unblocking sets administrative_safe flag"""
         connection, cursor = mock_mysql_connection
         cursor.rowcount = 1
-        cursor.fetchone.return_value = {'user_id': 'test_user'}
-        
-        with patch('lambda_function.implement_iam_unblocking', return_value=True):
-            with patch('lambda_function.send_enhanced_unblocking_email', return_value=True):
-                
-                result = lambda_function.execute_admin_unblocking(
-                    connection, 'test_user', 'Test unblock', 'admin_user'
-                )
-                
-                assert result is True
-                
-                # Find the UPDATE user_limits call
-                update_calls = [call for call in cursor.execute.call_args_list 
-                               if 'UPDATE user_limits' in str(call)]
-                assert len(update_calls) > 0
-                
-                # Verify administrative_safe is set to 'Y'
-                update_call = update_calls[0]
-                assert 'administrative_safe' in str(update_call)
-                assert "'Y'" in str(update_call)
+        
+        result = lf.execute_admin_unblocking(
+            connection, 'test_user', 'Test unblock', 'admin_user'
+        )
+        
+        assert result is True
+        
+        # Find the user_limits upsert
+        upserts = [sql for sql in executed_sql() if sql.startswith('INSERT INTO user_limits')]
+        assert len(upserts) == 1
+        
+        # Verify administrative_safe is set to 'Y' for existing users too
+        assert "ON DUPLICATE KEY UPDATE" in upserts[0]
+        assert "administrative_safe = 'Y'" in upserts[0]
     
-    def test_execute_admin_unblocking_creates_user_limits_if_missing(self, mock_mysql_connection, 
-                                                                      mock_iam_client, mock_lambda_client, 
-                                                                      mock_current_time):
+    def test_execute_admin_unblocking_creates_user_limits_if_missing(self, lf, unblocking_steps,
+                                                                     mock_mysql_connection, executed_sql,
+                                                                     mock_iam_client, mock_lambda_client,
+                                                                     frozen_now):
         """Test that admin unblocking creates user_limits entry if missing"""
         connection, cursor = mock_mysql_connection
         cursor.rowcount = 1
-        cursor.fetchone.return_value = None  # No existing user_limits record
-        
-        with patch('lambda_function.implement_iam_unblocking', return_value=True):
-            with patch('lambda_function.send_enhanced_unblocking_email', return_value=True):
-                
-                result = lambda_function.execute_admin_unblocking(
-                    connection, 'test_user', 'Test unblock', 'admin_user'
-                )
-                
-                assert result is True
-                
-                # Find the INSERT user_limits call
-                insert_calls = [call for call in cursor.execute.call_args_list 
-                               if 'INSERT INTO user_limits' in str(call)]
-                assert len(insert_calls) > 0
+        
+        result = lf.execute_admin_unblocking(
+            connection, 'test_user', 'Test unblock', 'admin_user'
+        )
+        
+        assert result is True
+        
+        # The upsert creates the entry without checking for it first
+        assert any(sql.startswith('INSERT INTO user_limits') for sql in executed_sql())
+        assert not any(sql.startswith('SELECT') for sql in executed_sql())
+        cursor.fetchone.assert_not_called()
     
-    def test_execute_admin_unblocking_database_failure(self, mock_mysql_connection, mock_iam_client, 
-                                                        mock_lambda_client, mock_current_time):
+    def test_execute_admin_unblocking_database_failure(self, lf, mock_mysql_connection, mock_iam_client, 
+                                                        mock_lambda_client, frozen_now):
         """Test admin unblocking with database failure"""
         connection, cursor = mock_mysql_connection
-        cursor.execute.side_effect = Exception('Database error')
+        cursor.execute.side_effect = Exception(DB_ERROR)
         
-        result = lambda_function.execute_admin_unblocking(
+        result = lf.execute_admin_unblocking(
             connection, 'test_user', 'Test unblock', 'admin_user'
         )
         
         assert result is False
-    
-    def test_execute_admin_unblocking_iam_failure(self, mock_mysql_connection, mock_iam_client, 
-                                                   mock_lambda_client, mock_current_time):
-        """Test admin unblocking with IAM failure (should still succeed)"""
-        connection, cursor = mock_mysql_connection
-        cursor.rowcount = 1
-        cursor.fetchone.return_value = {'user_id': 'test_user'}
-        
-        with patch('lambda_function.implement_iam_unblocking', return_value=False):
-            with patch('lambda_function.send_enhanced_unblocking_email', return_value=True):
-                
-                result = lambda_function.execute_admin_unblocking(
-                    connection, 'test_user', 'Test unblock', 'admin_user'
-                )
-                
-                # Should still succeed even if IAM fails (non-critical)
-                assert result is True
 
 
 # ============================================================================
@@ -789,22 +642,22 @@ class TestExecuteAdminUnblocking:
 class TestGetUserCurrentUsage:
     """Tests for get_user_current_usage function"""
     
-    def test_get_user_current_usage_success(self, mock_mysql_connection, mock_current_time):
+    def test_get_user_current_usage_success(self, lf, mock_mysql_connection, frozen_now):
         """Test successful retrieval of user current usage"""
         connection, cursor = mock_mysql_connection
         
-        # Mock database responses
-        cursor.fetchone.side_effect = [
-            {
-                'daily_request_limit': 350,
-                'monthly_request_limit': 5000,
-                'administrative_safe': 'N'
-            },
-            {'daily_requests_used': 250},
-            {'monthly_requests_used': 3500}
-        ]
+        # Limits and usage come back as a single row
+        cursor.fetchone.return_value = {
+            'daily_request_limit': 350,
+            'monthly_request_limit': 5000,
+            'administrative_safe': 'N',
+            'daily_requests_used': 250,
+            'monthly_requests_used': 3500
+        }
         
-        result = lambda_function.get_user_current_usage(connection, 'test_user')
+        result = lf.get_user_current_usage(connection, 'test_user')
+        
+        cursor.execute.assert_called_once()
         
         assert result['daily_requests_used'] == 250
         assert result['monthly_requests_used'] == 3500
@@ -814,48 +667,50 @@ class TestGetUserCurrentUsage:
         assert result['monthly_percent'] == pytest.approx(70.0, rel=0.1)
         assert result['administrative_safe'] is False
     
-    def test_get_user_current_usage_no_limits_record(self, mock_mysql_connection, mock_current_time):
+    def test_get_user_current_usage_no_limits_record(self, lf, mock_mysql_connection, frozen_now):
         """Test usage retrieval when user has no limits record"""
         connection, cursor = mock_mysql_connection
         
-        # Mock database responses
-        cursor.fetchone.side_effect = [
-            None,  # No limits record
-            {'daily_requests_used': 100},
-            {'monthly_requests_used': 1500}
-        ]
+        # No limits record: the LEFT JOIN leaves the limit columns NULL
+        cursor.fetchone.return_value = {
+            'daily_request_limit': None,
+            'monthly_request_limit': None,
+            'administrative_safe': None,
+            'daily_requests_used': 100,
+            'monthly_requests_used': 1500
+        }
         
-        result = lambda_function.get_user_current_usage(connection, 'test_user')
+        result = lf.get_user_current_usage(connection, 'test_user')
         
-        # Should use default limits
+        # Should use default limits and still report usage
+        assert result['daily_requests_used'] == 100
+        assert result['monthly_requests_used'] == 1500
         assert result['daily_limit'] == 350
         assert result['monthly_limit'] == 5000
         assert result['administrative_safe'] is False
     
-    def test_get_user_current_usage_with_admin_protection(self, mock_mysql_connection, mock_current_time):
+    def test_get_user_current_usage_with_admin_protection(self, lf, mock_mysql_connection, frozen_now):
         """Test usage retrieval for user with administrative protection"""
         connection, cursor = mock_mysql_connection
         
-        cursor.fetchone.side_effect = [
-            {
-                'daily_request_limit': 350,
-                'monthly_request_limit': 5000,
-                'administrative_safe': 'Y'
-            },
-            {'daily_requests_used': 250},
-            {'monthly_requests_used': 3500}
-        ]
+        cursor.fetchone.return_value = {
+            'daily_request_limit': 350,
+            'monthly_request_limit': 5000,
+            'administrative_safe': 'Y',
+            'daily_requests_used': 250,
+            'monthly_requests_used': 3500
+        }
         
-        result = lambda_function.get_user_current_usage(connection, 'test_user')
+        result = lf.get_user_current_usage(connection, 'test_user')
         
         assert result['administrative_safe'] is True
     
-    def test_get_user_current_usage_exception(self, mock_mysql_connection, mock_current_time):
+    def test_get_user_current_usage_exception(self, lf, mock_mysql_connection, frozen_now):
         """Test usage retrieval with database exception"""
         connection, cursor = mock_mysql_connection
-        cursor.execute.side_effect = Exception('Database error')
+        cursor.execute.side_effect = Exception(DB_ERROR)
         
-        result = lambda_function.get_user_current_usage(connection, 'test_user')
+        result = lf.get_user_current_usage(connection, 'test_user')
         
         # Should return default values on error
         assert result['daily_requests_used'] == 0
@@ -869,4 +724,6 @@ class TestGetUserCurrentUsage:
 # ============================================================================
 
 if __name__ == '__main__':
-    pytest.main([__file__, '-v', '--tb=short'])
+    # Runs in-process: the module-scoped frozen_now clock and MySQL mocks tie the
+    # whole module to one xdist worker, so -n would only start idle workers here
+    sys.exit(pytest.main([__file__, '-v', '--tb=short']))
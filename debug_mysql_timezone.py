@@ -4,6 +4,7 @@ Debug script to test MySQL timezone handling and datetime insertion
 """
 
 import pymysql
+from pymysql.constants import CLIENT
 import os
 from datetime import datetime
 
@@ -14,7 +15,9 @@ DB_CONFIG = {
     'database': 'bedrock_usage',
     'user': 'admin',
     'password': os.environ.get('DB_PASSWORD', ''),
-    'charset': 'utf8mb4'
+    'charset': 'utf8mb4',
+    # Lets the insert/read-back/cleanup statements go to RDS in a single round trip
+    'client_flag': CLIENT.MULTI_STATEMENTS
 }
 
 def debug_mysql_timezone():
@@ -42,26 +45,31 @@ def debug_mysql_timezone():
             print(f"Inserting blocked_at: {blocked_at}")
             print(f"Inserting blocked_until: {blocked_until}")
             
-            # Delete any existing test record
-            cursor.execute("DELETE FROM bedrock_usage.user_blocking_status WHERE user_id = %s", (test_user,))
-            
-            # Insert test record with exact same query as JavaScript
+            # Delete any existing test record, insert the test record with exact same
+            # query as JavaScript, immediately query what was stored and clean up
             insert_query = """
                 INSERT INTO bedrock_usage.user_blocking_status 
                 (user_id, is_blocked, blocked_reason, blocked_at, blocked_until, created_at)
                 VALUES (%s, 'Y', %s, %s, %s, %s)
             """
             
-            cursor.execute(insert_query, [test_user, "TEST DEBUG", blocked_at, blocked_until, blocked_at])
-            
-            # Immediately query what was stored
-            cursor.execute("""
+            cursor.execute(f"""
+                DELETE FROM bedrock_usage.user_blocking_status WHERE user_id = %s;
+                {insert_query};
                 SELECT user_id, blocked_at, blocked_until, created_at
                 FROM bedrock_usage.user_blocking_status 
-                WHERE user_id = %s
-            """, (test_user,))
+                WHERE user_id = %s;
+                DELETE FROM bedrock_usage.user_blocking_status WHERE user_id = %s
+            """, [test_user, test_user, "TEST DEBUG", blocked_at, blocked_until, blocked_at, test_user, test_user])
             
+            # Skip the DELETE and INSERT results to reach the SELECT
+            cursor.nextset()
+            cursor.nextset()
             result = cursor.fetchone()
+            
+            # Read the cleanup DELETE result so the connection is ready to commit
+            cursor.nextset()
+            
             if result:
                 print(f"\n=== What was actually stored ===")
                 print(f"User ID: {result[0]}")
@@ -85,9 +93,6 @@ def debug_mysql_timezone():
                     else:
                         print(f"✅ Duration matches expected value")
             
-            # Clean up test record
-            cursor.execute("DELETE FROM bedrock_usage.user_blocking_status WHERE user_id = %s", (test_user,))
-            
         connection.commit()
         connection.close()
         
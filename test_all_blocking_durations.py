@@ -4,19 +4,41 @@ Comprehensive Testing Script for User Blocking/Unblocking
 Tests all possible duration values for user 'delta_001'
 """
 
-import boto3
 import json
+import os
 import time
 from datetime import datetime, timedelta
+from functools import cached_property
 import pytz
 
+MADRID_TZ = pytz.timezone('Europe/Madrid')
+
+# Format of the custom block end date (e.g. 20/10/2025 10:00)
+CUSTOM_DATE_FORMAT = "%d/%m/%Y %H:%M"
+
 class BlockingDurationTester:
+    # Offset from now at which each fixed-length duration expires
+    DURATION_DELTAS = {
+        "1 day": timedelta(days=1),
+        "30 days": timedelta(days=30),
+        "90 days": timedelta(days=90)
+    }
+    
     def __init__(self):
-        self.lambda_client = boto3.client('lambda', region_name='eu-west-1')
         self.function_name = 'bedrock-realtime-usage-controller'
         self.test_user = 'delta_001'
-        self.madrid_tz = pytz.timezone('Europe/Madrid')
-        
+        # Invocations are synchronous, so no settle time is needed by default;
+        # set TEST_WAIT_SECONDS to pause between operations on smoke runs
+        self.wait_seconds = float(os.environ.get('TEST_WAIT_SECONDS', 0))
+        # Set TEST_VERBOSE to also print the full request/response payloads
+        self.verbose = bool(os.environ.get('TEST_VERBOSE'))
+    
+    @cached_property
+    def lambda_client(self):
+        """Lambda client, created on first invoke so importing this module stays cheap"""
+        import boto3
+        return boto3.client('lambda', region_name='eu-west-1')
+    
     def invoke_lambda(self, payload):
         """Invoke the Lambda function with the given payload"""
         try:
@@ -27,7 +49,8 @@ class BlockingDurationTester:
             )
             
             result = json.loads(response['Payload'].read())
-            print(f"Lambda Response: {json.dumps(result, indent=2)}")
+            if self.verbose:
+                print(f"Lambda Response: {json.dumps(result, indent=2)}")
             return result
             
         except Exception as e:
@@ -41,19 +64,16 @@ class BlockingDurationTester:
         print(f"{'='*60}")
         
         # Calculate expires_at based on duration type
+        now = datetime.now(MADRID_TZ)
         expires_at = None
-        if duration_type == "1 day":
-            expires_at = (datetime.now(self.madrid_tz) + timedelta(days=1)).isoformat()
-        elif duration_type == "30 days":
-            expires_at = (datetime.now(self.madrid_tz) + timedelta(days=30)).isoformat()
-        elif duration_type == "90 days":
-            expires_at = (datetime.now(self.madrid_tz) + timedelta(days=90)).isoformat()
+        if duration_type in self.DURATION_DELTAS:
+            expires_at = (now + self.DURATION_DELTAS[duration_type]).isoformat(timespec='seconds')
         elif duration_type == "custom" and custom_date:
-            # Parse custom date (format: 20/10/2025 10:00)
+            # Parse custom date
             try:
-                custom_dt = datetime.strptime(custom_date, "%d/%m/%Y %H:%M")
-                custom_dt = self.madrid_tz.localize(custom_dt)
-                expires_at = custom_dt.isoformat()
+                custom_dt = datetime.strptime(custom_date, CUSTOM_DATE_FORMAT)
+                custom_dt = MADRID_TZ.localize(custom_dt)
+                expires_at = custom_dt.isoformat(timespec='seconds')
             except ValueError as e:
                 print(f"Error parsing custom date: {e}")
                 return False
@@ -68,7 +88,7 @@ class BlockingDurationTester:
             "duration": duration_type,
             "expires_at": expires_at,
             "usage_record": {
-                "timestamp": datetime.now(self.madrid_tz).isoformat(),
+                "timestamp": now.isoformat(timespec='seconds'),
                 "model_id": "anthropic.claude-3-sonnet-20240229-v1:0",
                 "input_tokens": 100,
                 "output_tokens": 50,
@@ -76,7 +96,8 @@ class BlockingDurationTester:
             }
         }
         
-        print(f"Payload: {json.dumps(payload, indent=2)}")
+        if self.verbose:
+            print(f"Payload: {json.dumps(payload, indent=2)}")
         result = self.invoke_lambda(payload)
         
         if result and result.get('statusCode') == 200:
@@ -103,7 +124,8 @@ class BlockingDurationTester:
             "performed_by": "test_script"
         }
         
-        print(f"Payload: {json.dumps(payload, indent=2)}")
+        if self.verbose:
+            print(f"Payload: {json.dumps(payload, indent=2)}")
         result = self.invoke_lambda(payload)
         
         if result and result.get('statusCode') == 200:
@@ -113,16 +135,17 @@ class BlockingDurationTester:
             print(f"❌ Failed to unblock user '{self.test_user}'")
             return False
     
-    def wait_between_tests(self, seconds=3):
+    def wait_between_tests(self):
         """Wait between test operations"""
-        print(f"\nWaiting {seconds} seconds before next operation...")
-        time.sleep(seconds)
+        if self.wait_seconds:
+            print(f"\nWaiting {self.wait_seconds:g} seconds before next operation...")
+            time.sleep(self.wait_seconds)
     
     def run_comprehensive_test(self):
         """Run all blocking duration tests"""
         print(f"\n{'#'*80}")
         print(f"COMPREHENSIVE BLOCKING DURATION TEST FOR USER: {self.test_user}")
-        print(f"Test Started: {datetime.now(self.madrid_tz).strftime('%Y-%m-%d %H:%M:%S %Z')}")
+        print(f"Test Started: {datetime.now(MADRID_TZ).strftime('%Y-%m-%d %H:%M:%S %Z')}")
         print(f"{'#'*80}")
         
         test_cases = [
@@ -144,7 +167,7 @@ class BlockingDurationTester:
             
             # Unblock user
             unblock_success = self.unblock_user()
-            self.wait_between_tests(5)  # Longer wait between test cases
+            self.wait_between_tests()
             
             results.append({
                 'test_case': i,
@@ -188,7 +211,7 @@ class BlockingDurationTester:
                 if not result['unblock_success']:
                     print(f"         Unblock operation failed")
         
-        print(f"\nTest Completed: {datetime.now(self.madrid_tz).strftime('%Y-%m-%d %H:%M:%S %Z')}")
+        print(f"\nTest Completed: {datetime.now(MADRID_TZ).strftime('%Y-%m-%d %H:%M:%S %Z')}")
         print(f"{'#'*80}")
 
 def main():
@@ -5,6 +5,7 @@ Tests blocking with custom date and unblocking operations
 """
 
 import json
+import os
 import boto3
 from datetime import datetime, timedelta
 import pytz
@@ -13,6 +14,18 @@ import pytz
 LAMBDA_FUNCTION_NAME = 'bedrock-realtime-usage-controller'
 REGION = 'eu-west-1'
 TEST_USER_ID = 'sdlc004'
+# Set TEST_VERBOSE to also print the full request/response payloads
+VERBOSE = bool(os.environ.get('TEST_VERBOSE'))
+
+# Usage record sent with every block/unblock request (plus the current date)
+BASE_USAGE_RECORD = {
+    'request_count': 100,
+    'daily_limit': 350,
+    'team': 'test_team'
+}
+
+# Separator line around each test section
+BANNER = "=" * 80
 
 # CET timezone
 CET = pytz.timezone('Europe/Madrid')
@@ -41,14 +54,14 @@ def invoke_lambda(payload):
 
 def test_custom_date_blocking():
     """Test blocking with custom date (7 days from now)"""
-    print("\n" + "="*80)
+    print("\n" + BANNER)
     print("TEST 1: Blocking with Custom Date (7 days from now)")
-    print("="*80)
+    print(BANNER)
     
     # Calculate custom date: 7 days from now
     current_cet = get_current_cet_time()
     custom_date = current_cet + timedelta(days=7)
-    custom_date_iso = custom_date.isoformat()
+    custom_date_iso = custom_date.isoformat(timespec='seconds')
     
     print(f"📅 Current CET time: {current_cet.strftime('%Y-%m-%d %H:%M:%S')}")
     print(f"📅 Custom blocking until: {custom_date.strftime('%Y-%m-%d %H:%M:%S')} CET")
@@ -62,22 +75,19 @@ def test_custom_date_blocking():
         'performed_by': 'test_script',
         'duration': 'custom',
         'expires_at': custom_date_iso,
-        'usage_record': {
-            'request_count': 100,
-            'daily_limit': 350,
-            'team': 'test_team',
-            'date': current_cet.strftime('%Y-%m-%d')
-        }
+        'usage_record': {**BASE_USAGE_RECORD, 'date': current_cet.strftime('%Y-%m-%d')}
     }
     
     print(f"\n📤 Sending blocking request...")
-    print(f"Payload: {json.dumps(blocking_payload, indent=2)}")
+    if VERBOSE:
+        print(f"Payload: {json.dumps(blocking_payload, indent=2)}")
     
     response = invoke_lambda(blocking_payload)
     
     if response:
-        print(f"\n📥 Lambda Response:")
-        print(json.dumps(response, indent=2))
+        if VERBOSE:
+            print(f"\n📥 Lambda Response:")
+            print(json.dumps(response, indent=2))
         
         if response.get('statusCode') == 200:
             print(f"\n✅ TEST 1 PASSED: User {TEST_USER_ID} blocked successfully with custom date")
@@ -91,9 +101,9 @@ def test_custom_date_blocking():
 
 def test_30_days_blocking():
     """Test blocking with 30 days duration"""
-    print("\n" + "="*80)
+    print("\n" + BANNER)
     print("TEST 2: Blocking with 30 Days Duration")
-    print("="*80)
+    print(BANNER)
     
     current_cet = get_current_cet_time()
     expected_date = current_cet + timedelta(days=30)
@@ -108,22 +118,19 @@ def test_30_days_blocking():
         'reason': 'Test: 30 days blocking',
         'performed_by': 'test_script',
         'duration': '30days',
-        'usage_record': {
-            'request_count': 100,
-            'daily_limit': 350,
-            'team': 'test_team',
-            'date': current_cet.strftime('%Y-%m-%d')
-        }
+        'usage_record': {**BASE_USAGE_RECORD, 'date': current_cet.strftime('%Y-%m-%d')}
     }
     
     print(f"\n📤 Sending blocking request...")
-    print(f"Payload: {json.dumps(blocking_payload, indent=2)}")
+    if VERBOSE:
+        print(f"Payload: {json.dumps(blocking_payload, indent=2)}")
     
     response = invoke_lambda(blocking_payload)
     
     if response:
-        print(f"\n📥 Lambda Response:")
-        print(json.dumps(response, indent=2))
+        if VERBOSE:
+            print(f"\n📥 Lambda Response:")
+            print(json.dumps(response, indent=2))
         
         if response.get('statusCode') == 200:
             print(f"\n✅ TEST 2 PASSED: User {TEST_USER_ID} blocked successfully with 30 days duration")
@@ -137,9 +144,9 @@ def test_30_days_blocking():
 
 def test_90_days_blocking():
     """Test blocking with 90 days duration"""
-    print("\n" + "="*80)
+    print("\n" + BANNER)
     print("TEST 3: Blocking with 90 Days Duration")
-    print("="*80)
+    print(BANNER)
     
     current_cet = get_current_cet_time()
     expected_date = current_cet + timedelta(days=90)
@@ -154,22 +161,19 @@ def test_90_days_blocking():
         'reason': 'Test: 90 days blocking',
         'performed_by': 'test_script',
         'duration': '90days',
-        'usage_record': {
-            'request_count': 100,
-            'daily_limit': 350,
-            'team': 'test_team',
-            'date': current_cet.strftime('%Y-%m-%d')
-        }
+        'usage_record': {**BASE_USAGE_RECORD, 'date': current_cet.strftime('%Y-%m-%d')}
     }
     
     print(f"\n📤 Sending blocking request...")
-    print(f"Payload: {json.dumps(blocking_payload, indent=2)}")
+    if VERBOSE:
+        print(f"Payload: {json.dumps(blocking_payload, indent=2)}")
     
     response = invoke_lambda(blocking_payload)
     
     if response:
-        print(f"\n📥 Lambda Response:")
-        print(json.dumps(response, indent=2))
+        if VERBOSE:
+            print(f"\n📥 Lambda Response:")
+            print(json.dumps(response, indent=2))
         
         if response.get('statusCode') == 200:
             print(f"\n✅ TEST 3 PASSED: User {TEST_USER_ID} blocked successfully with 90 days duration")
@@ -183,9 +187,9 @@ def test_90_days_blocking():
 
 def test_check_blocking_status():
     """Test checking user blocking status"""
-    print("\n" + "="*80)
+    print("\n" + BANNER)
     print("TEST 4: Check User Blocking Status")
-    print("="*80)
+    print(BANNER)
     
     status_payload = {
         'action': 'check_status',
@@ -197,8 +201,9 @@ def test_check_blocking_status():
     response = invoke_lambda(status_payload)
     
     if response:
-        print(f"\n📥 Lambda Response:")
-        print(json.dumps(response, indent=2))
+        if VERBOSE:
+            print(f"\n📥 Lambda Response:")
+            print(json.dumps(response, indent=2))
         
         if response.get('statusCode') == 200:
             body = json.loads(response.get('body', '{}'))
@@ -228,31 +233,28 @@ def test_check_blocking_status():
 
 def test_unblocking():
     """Test unblocking user"""
-    print("\n" + "="*80)
+    print("\n" + BANNER)
     print("TEST 5: Unblocking User")
-    print("="*80)
+    print(BANNER)
     
     unblocking_payload = {
         'action': 'unblock',
         'user_id': TEST_USER_ID,
         'reason': 'Test: Manual unblock',
         'performed_by': 'test_script',
-        'usage_record': {
-            'request_count': 100,
-            'daily_limit': 350,
-            'team': 'test_team',
-            'date': get_current_cet_time().strftime('%Y-%m-%d')
-        }
+        'usage_record': {**BASE_USAGE_RECORD, 'date': get_current_cet_time().strftime('%Y-%m-%d')}
     }
     
     print(f"\n📤 Sending unblocking request...")
-    print(f"Payload: {json.dumps(unblocking_payload, indent=2)}")
+    if VERBOSE:
+        print(f"Payload: {json.dumps(unblocking_payload, indent=2)}")
     
     response = invoke_lambda(unblocking_payload)
     
     if response:
-        print(f"\n📥 Lambda Response:")
-        print(json.dumps(response, indent=2))
+        if VERBOSE:
+            print(f"\n📥 Lambda Response:")
+            print(json.dumps(response, indent=2))
         
         if response.get('statusCode') == 200:
             print(f"\n✅ TEST 5 PASSED: User {TEST_USER_ID} unblocked successfully")
@@ -266,9 +268,9 @@ def test_unblocking():
 
 def test_verify_unblocked_status():
     """Test verifying user is unblocked"""
-    print("\n" + "="*80)
+    print("\n" + BANNER)
     print("TEST 6: Verify User is Unblocked")
-    print("="*80)
+    print(BANNER)
     
     status_payload = {
         'action': 'check_status',
@@ -280,8 +282,9 @@ def test_verify_unblocked_status():
     response = invoke_lambda(status_payload)
     
     if response:
-        print(f"\n📥 Lambda Response:")
-        print(json.dumps(response, indent=2))
+        if VERBOSE:
+            print(f"\n📥 Lambda Response:")
+            print(json.dumps(response, indent=2))
         
         if response.get('statusCode') == 200:
             body = json.loads(response.get('body', '{}'))
@@ -305,13 +308,13 @@ def test_verify_unblocked_status():
 
 def main():
     """Run all tests"""
-    print("\n" + "="*80)
+    print("\n" + BANNER)
     print("CUSTOM BLOCKING DURATION TESTS")
-    print("="*80)
+    print(BANNER)
     print(f"Testing Lambda function: {LAMBDA_FUNCTION_NAME}")
     print(f"Region: {REGION}")
     print(f"Test user: {TEST_USER_ID}")
-    print("="*80)
+    print(BANNER)
     
     results = []
     
@@ -343,9 +346,9 @@ def main():
     results.append(("Final Unblock", test_unblocking()))
     
     # Print summary
-    print("\n" + "="*80)
+    print("\n" + BANNER)
     print("TEST SUMMARY")
-    print("="*80)
+    print(BANNER)
     
     passed = 0
     failed = 0
@@ -358,11 +361,11 @@ def main():
         else:
             failed += 1
     
-    print("="*80)
+    print(BANNER)
     print(f"Total: {len(results)} tests")
     print(f"Passed: {passed}")
     print(f"Failed: {failed}")
-    print("="*80)
+    print(BANNER)
     
     if failed == 0:
         print("\n🎉 ALL TESTS PASSED!")
@@ -5,7 +5,9 @@ for the blocking functionality.
 """
 
 import pymysql
+from pymysql.constants import CLIENT
 import os
+from collections import namedtuple
 from datetime import datetime
 
 # Database configuration
@@ -15,9 +17,20 @@ DB_CONFIG = {
     'database': 'bedrock_usage',
     'user': 'admin',
     'password': os.environ.get('DB_PASSWORD', ''),  # You'll need to set this
-    'charset': 'utf8mb4'
+    'charset': 'utf8mb4',
+    # Lets the three lookups go to RDS in a single round trip
+    'client_flag': CLIENT.MULTI_STATEMENTS
 }
 
+# User whose blocking records are inspected
+TEST_USER_ID = 'delta_001'
+
+# Number of recent audit log entries to show
+AUDIT_ENTRIES = 3
+
+# Columns selected from blocking_audit_log, in query order
+AuditRow = namedtuple('AuditRow', ['user_id', 'operation_timestamp', 'blocked_until', 'operation_reason'])
+
 def test_database_values():
     """Check what values are actually stored in the database"""
     try:
@@ -25,23 +38,31 @@ def test_database_values():
         connection = pymysql.connect(**DB_CONFIG)
         
         with connection.cursor() as cursor:
-            # Check current timezone settings
-            cursor.execute("SELECT @@session.time_zone, @@global.time_zone, NOW() as current_time")
-            timezone_info = cursor.fetchone()
-            print(f"Database timezone info: {timezone_info}")
-            
-            # Check the most recent blocking record for delta_001
+            # Timezone settings, latest blocking record and recent audit entries for
+            # the test user, read back one result set at a time with nextset()
             cursor.execute("""
+                SELECT @@session.time_zone, @@global.time_zone, NOW() as current_time;
                 SELECT user_id, blocked_at, blocked_until, created_at, updated_at
                 FROM bedrock_usage.user_blocking_status 
-                WHERE user_id = 'delta_001'
+                WHERE user_id = %s
                 ORDER BY updated_at DESC 
-                LIMIT 1
-            """)
+                LIMIT 1;
+                SELECT user_id, operation_timestamp, blocked_until, operation_reason
+                FROM bedrock_usage.blocking_audit_log 
+                WHERE user_id = %s 
+                ORDER BY operation_timestamp DESC 
+                LIMIT %s
+            """, (TEST_USER_ID, TEST_USER_ID, AUDIT_ENTRIES))
             
+            # Check current timezone settings
+            timezone_info = cursor.fetchone()
+            print(f"Database timezone info: {timezone_info}")
+            
+            # Check the most recent blocking record for the test user
+            cursor.nextset()
             result = cursor.fetchone()
             if result:
-                print(f"\nMost recent blocking record for delta_001:")
+                print(f"\nMost recent blocking record for {TEST_USER_ID}:")
                 print(f"User ID: {result[0]}")
                 print(f"Blocked At: {result[1]}")
                 print(f"Blocked Until: {result[2]}")
@@ -55,21 +76,15 @@ def test_database_values():
                     duration = blocked_until - blocked_at
                     print(f"Duration: {duration} ({duration.days} days)")
             else:
-                print("No blocking record found for delta_001")
+                print(f"No blocking record found for {TEST_USER_ID}")
             
             # Check recent audit log entries
-            cursor.execute("""
-                SELECT user_id, operation_timestamp, blocked_until, operation_reason
-                FROM bedrock_usage.blocking_audit_log 
-                WHERE user_id = 'delta_001' 
-                ORDER BY operation_timestamp DESC 
-                LIMIT 3
-            """)
-            
-            audit_results = cursor.fetchall()
-            print(f"\nRecent audit log entries for delta_001:")
-            for i, audit in enumerate(audit_results):
-                print(f"  {i+1}. Timestamp: {audit[1]}, Blocked Until: {audit[2]}, Reason: {audit[3]}")
+            cursor.nextset()
+            audit_results = map(AuditRow._make, cursor.fetchmany(AUDIT_ENTRIES))
+            print(f"\nRecent audit log entries for {TEST_USER_ID}:")
+            for i, audit in enumerate(audit_results, 1):
+                print(f"  {i}. Timestamp: {audit.operation_timestamp}, Blocked Until: {audit.blocked_until}, "
+                      f"Reason: {audit.operation_reason}")
         
         connection.close()
         
@@ -3,11 +3,24 @@
 Simple test to verify the Knowledge Base filtering logic
 """
 
+# Separator line around the test output
+BANNER = "=" * 60
+
+# (team, person) tag pairs that identify a Knowledge Base session
+KNOWLEDGE_BASE_TAGS = frozenset({('unknown', 'Unknown')})
+
+def is_knowledge_base_session(team, person):
+    """
+    Mirrors the inline Knowledge Base filter in bedrock-realtime-usage-controller.py
+    (team == 'unknown' and person == 'Unknown'); keep the two in sync
+    """
+    return (team, person) in KNOWLEDGE_BASE_TAGS
+
 def test_filtering_logic():
     """Test the filtering logic without external dependencies"""
     
     print("🧪 Testing Knowledge Base Session Filtering Logic")
-    print("=" * 60)
+    print(BANNER)
     
     # Test scenarios
     test_cases = [
@@ -57,7 +70,7 @@ def test_filtering_logic():
         print(f"   Description: {test_case['description']}")
         
         # Apply the filtering logic
-        should_filter = (test_case['team'] == 'unknown' and test_case['person'] == 'Unknown')
+        should_filter = is_knowledge_base_session(test_case['team'], test_case['person'])
         
         print(f"   Filtering Logic Result: {'FILTER OUT' if should_filter else 'PROCESS'}")
         print(f"   Expected Result: {'FILTER OUT' if test_case['should_filter'] else 'PROCESS'}")
@@ -68,7 +81,7 @@ def test_filtering_logic():
             print("   ❌ FAIL")
             all_passed = False
     
-    print("\n" + "=" * 60)
+    print("\n" + BANNER)
     print("🎯 Filtering Logic Summary:")
     print("   IF (team == 'unknown' AND person == 'Unknown'):")
     print("       → FILTER OUT (don't record in database)")
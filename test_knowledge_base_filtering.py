@@ -16,19 +16,21 @@ os.environ['RDS_USERNAME'] = 'test-user'
 os.environ['RDS_PASSWORD'] = 'test-password'
 os.environ['RDS_DATABASE'] = 'test-db'
 
+# IAM tags of the simulated users; any other user has no tags
+MOCK_USER_TAGS = {
+    # Simulate knowledge base user with no tags
+    'knowledge-base-user': [],
+    # Simulate regular user with proper tags
+    'regular-user': [
+        {'Key': 'Team', 'Value': 'yo_leo_engineering'},
+        {'Key': 'Person', 'Value': 'John Doe'}
+    ]
+}
+
 # Mock boto3 clients
 class MockIAMClient:
     def list_user_tags(self, UserName):
-        # Simulate knowledge base user with no tags
-        if UserName == 'knowledge-base-user':
-            return {'Tags': []}
-        # Simulate regular user with proper tags
-        elif UserName == 'regular-user':
-            return {'Tags': [
-                {'Key': 'Team', 'Value': 'yo_leo_engineering'},
-                {'Key': 'Person', 'Value': 'John Doe'}
-            ]}
-        return {'Tags': []}
+        return {'Tags': MOCK_USER_TAGS.get(UserName, [])}
     
     def get_groups_for_user(self, UserName):
         return {'Groups': []}
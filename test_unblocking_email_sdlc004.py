@@ -7,13 +7,32 @@ Este script invoca directamente la Lambda bedrock-email-service para
 verificar que el email con formato HTML mejorado se envía correctamente.
 """
 
+import argparse
 import json
+import select
+import sys
 import boto3
 from datetime import datetime
 
 # Cliente Lambda
 lambda_client = boto3.client('lambda', region_name='eu-west-1')
 
+def _timed_input(prompt, timeout=5.0, default='n'):
+    """
+    Pregunta por stdin y devuelve la respuesta, o `default` si no se responde
+    en `timeout` segundos. En Windows select() solo admite sockets, así que
+    allí se espera la respuesta con input() sin timeout
+    """
+    print(prompt, end="", flush=True)
+    try:
+        ready, _, _ = select.select([sys.stdin], [], [], timeout)
+    except OSError:
+        return input().strip().lower() or default
+    if not ready:
+        print(default)
+        return default
+    return sys.stdin.readline().strip().lower() or default
+
 def test_unblocking_email_for_sdlc004():
     """
     Prueba unitaria: Enviar email de desbloqueo automático para sdlc_004
@@ -134,6 +153,11 @@ def test_admin_unblocking_email_for_sdlc004():
         return False
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Pruebas de email de desbloqueo para sdlc_004")
+    parser.add_argument('--include-admin-test', action='store_true',
+                        help="Ejecutar también la prueba de desbloqueo manual sin preguntar")
+    args = parser.parse_args()
+    
     print()
     print("🧪 INICIANDO PRUEBAS UNITARIAS DE EMAIL")
     print(f"⏰ Fecha/Hora: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
@@ -146,15 +170,18 @@ if __name__ == "__main__":
     print("-" * 80)
     print()
     
-    # Ejecutar prueba adicional (opcional)
-    print("¿Deseas ejecutar también la prueba de desbloqueo manual? (s/n): ", end="")
-    try:
-        choice = input().strip().lower()
-        if choice == 's':
-            print()
-            test2_result = test_admin_unblocking_email_for_sdlc004()
-    except:
-        pass
+    # Ejecutar prueba adicional (opcional): con --include-admin-test, o preguntando
+    # solo si hay un terminal interactivo, para no bloquear ejecuciones automáticas
+    run_admin_test = args.include_admin_test
+    if not run_admin_test and sys.stdin.isatty():
+        try:
+            run_admin_test = _timed_input("¿Deseas ejecutar también la prueba de desbloqueo manual? (s/n): ") == 's'
+        except KeyboardInterrupt:
+            pass
+    
+    if run_admin_test:
+        print()
+        test2_result = test_admin_unblocking_email_for_sdlc004()
     
     print()
     print("=" * 80)